@@ -3,17 +3,61 @@ Agent1 - Servidor MCP com Ollama Local
 Gera rascunhos de posts usando modelo Llama
 """
 
+import time
+_PROCESS_START = time.perf_counter()
+
+import asyncio
+import json
+import os
 import httpx
 from fastmcp import FastMCP
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Dict, List, Mapping, Optional, Tuple
 import uvicorn
 import logging
 
+from shared.cassette import request_key, shared_cassette
+from shared.codec import CodecMiddleware
+from shared.profiling import ProfilingMiddleware
+from priority import PRIORITY_CLASSES, PriorityLimiter
+
+# Tempo gasto em cada fase da inicialização (segundos)
+STARTUP_TIMINGS: Dict[str, float] = {"imports": round(time.perf_counter() - _PROCESS_START, 3)}
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ollama
+OLLAMA_URL = os.getenv("OLLAMA_HOST", "http://ollama:11434").rstrip("/")
+if not OLLAMA_URL.startswith("http"):
+    OLLAMA_URL = f"http://{OLLAMA_URL}"
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:1b")
+OLLAMA_WAIT_TIMEOUT = float(os.getenv("OLLAMA_WAIT_TIMEOUT", "300"))
+# Intervalo entre novas tentativas quando a preparação (espera/pull) falha
+OLLAMA_RETRY_INTERVAL = float(os.getenv("OLLAMA_RETRY_INTERVAL", "30"))
+# Teto por geração quando o chamador não envia prazo (X-Deadline-Ms)
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+# Fila na frente do Ollama: no máximo OLLAMA_MAX_PARALLEL gerações (o agente
+# roda com um único worker), interativas primeiro (cabeçalho X-Priority: interactive | batch)
+PRIORITY_HEADER = "X-Priority"
+ollama_limiter = PriorityLimiter(
+    max_parallel=int(os.getenv("OLLAMA_MAX_PARALLEL", os.getenv("OLLAMA_NUM_PARALLEL", "2"))),
+    aging_seconds=float(os.getenv("PRIORITY_AGING_SECONDS", "30"))
+)
+
+# Cliente HTTP do Ollama (pool keep-alive): criado no startup, fechado no shutdown
+ollama_client: Optional[httpx.AsyncClient] = None
+
+# Gravação/reprodução das chamadas ao Ollama (CASSETTE_MODE=record|replay)
+ollama_cassette = shared_cassette("ollama")
+
+# Estado de prontidão: "starting" até o Ollama responder e o modelo existir
+readiness = {"status": "starting", "detail": "aguardando Ollama"}
+
 # Criar servidor MCP
 mcp = FastMCP("Agent1-Llama-Local")
 
@@ -22,64 +66,267 @@ class GenerateDraftRequest(BaseModel):
     topic: str
     style: str
     tone: str = "neutro"
+    variants: int = Field(default=1, ge=1, le=8)
 
-@mcp.tool()
-async def generate_draft(topic: str, style: str, tone: str = "neutro") -> str:
-    """Gera um rascunho inicial usando Ollama local."""
+def _empty_usage() -> Dict[str, int]:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+def _sum_usage(usages: List[Dict[str, int]]) -> Dict[str, int]:
+    total = _empty_usage()
+    for usage in usages:
+        for key in total:
+            total[key] += usage.get(key, 0)
+    return total
+
+async def _call_ollama(payload: Dict, priority: str) -> Tuple[int, Dict]:
+    """POST /api/generate no Ollama (ou no cassete); retorna (status, corpo)"""
+    key = request_key("ollama", payload)
+    if ollama_cassette is not None and ollama_cassette.mode == "replay":
+        async with ollama_limiter.slot(priority):
+            entry = await ollama_cassette.replay(key)
+        return entry["status"], entry["response"]
+    
+    async with ollama_limiter.slot(priority):
+        start = time.perf_counter()
+        response = await ollama_client.post(f"{OLLAMA_URL}/api/generate", json=payload)
+        latency = time.perf_counter() - start
+    data = response.json() if response.status_code == 200 else {"error": response.text}
+    # `context` (tokens da conversa, milhares de inteiros) não é usado; não vai para o cassete
+    data.pop("context", None)
+    if ollama_cassette is not None:
+        ollama_cassette.record(key, payload, data, latency, response.status_code)
+    return response.status_code, data
+
+async def _generate_draft(
+    topic: str, style: str, tone: str = "neutro", priority: str = "interactive"
+) -> Tuple[str, Dict[str, int]]:
+    """Chama o Ollama e retorna o rascunho junto com a contagem de tokens."""
     prompt = f"Crie uma caption para Instagram. Tópico: {topic}, Estilo: {style}, Tom: {tone}. Retorne apenas o texto."
     
     try:
         logger.info(f"📝 Conectando ao Ollama para gerar rascunho...")
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                "http://ollama:11434/api/generate",
-                json={"model": "llama3.2:1b", "prompt": prompt, "stream": False}
-            )
-            if response.status_code != 200:
-                logger.error(f"❌ Ollama retornou status {response.status_code}")
-                return f"Erro: Status {response.status_code}"
-            
-            result = response.json().get("response", "").strip()
-            if result:
-                logger.info(f"✅ Rascunho gerado com sucesso")
-                return result
-            else:
-                logger.error(f"❌ Resposta vazia do Ollama")
-                return "Erro: Resposta vazia do Ollama"
+        status_code, data = await _call_ollama(
+            {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False}, priority
+        )
+        if status_code != 200:
+            logger.error(f"❌ Ollama retornou status {status_code}")
+            return f"Erro: Status {status_code}", _empty_usage()
+        
+        prompt_tokens = data.get("prompt_eval_count", 0) or 0
+        completion_tokens = data.get("eval_count", 0) or 0
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        
+        result = data.get("response", "").strip()
+        if result:
+            logger.info(f"✅ Rascunho gerado com sucesso ({usage['total_tokens']} tokens)")
+            return result, usage
+        else:
+            logger.error(f"❌ Resposta vazia do Ollama")
+            return "Erro: Resposta vazia do Ollama", usage
     except httpx.ConnectError as e:
         logger.error(f"❌ Não conseguiu conectar ao Ollama: {e}")
-        return f"Erro: Não conseguiu conectar ao Ollama - {str(e)}"
+        return f"Erro: Não conseguiu conectar ao Ollama - {str(e)}", _empty_usage()
     except Exception as e:
         logger.error(f"❌ Erro ao chamar Ollama: {e}")
-        return f"Erro ao conectar Ollama: {str(e)}"
+        return f"Erro ao conectar Ollama: {str(e)}", _empty_usage()
+
+async def _generate_drafts(
+    topic: str, style: str, tone: str, variants: int, priority: str = "interactive"
+) -> List[Tuple[str, Dict[str, int]]]:
+    logger.info(f"📝 Gerando {variants} variantes de rascunho...")
+    return list(await asyncio.gather(
+        *(_generate_draft(topic, style, tone, priority) for _ in range(variants))
+    ))
+
+@mcp.tool()
+async def generate_draft(topic: str, style: str, tone: str = "neutro") -> str:
+    """Gera um rascunho inicial usando Ollama local."""
+    draft, _ = await _generate_draft(topic, style, tone)
+    return draft
+
+@mcp.tool()
+async def generate_drafts(topic: str, style: str, tone: str = "neutro", variants: int = 1) -> List[str]:
+    """Gera vários rascunhos concorrentemente dentro de uma única requisição."""
+    return [draft for draft, _ in await _generate_drafts(topic, style, tone, variants)]
 
 # ✅ CORREÇÃO CRÍTICA: Criar aplicação FastAPI com os endpoints do FastMCP
 app = FastAPI(title="Agent1 - Llama Local")
 
+# Profiling sob demanda (cabeçalho X-Profile com PROFILING=1, ou PROFILE_SAMPLE_RATE)
+ProfilingMiddleware.install(app, service="agent1", default_dir="/app/profiles")
+
+# Corpos JSON com gzip quando o cliente negocia
+CodecMiddleware.install(app)
+
+async def _wait_for_ollama(client: httpx.AsyncClient) -> List[str]:
+    """Aguarda o Ollama responder e retorna os modelos já disponíveis"""
+    deadline = time.perf_counter() + OLLAMA_WAIT_TIMEOUT
+    while True:
+        try:
+            response = await client.get(f"{OLLAMA_URL}/api/tags", timeout=5.0)
+            if response.status_code == 200:
+                return [m.get("name", "") for m in response.json().get("models", [])]
+        except httpx.HTTPError:
+            pass
+        if time.perf_counter() >= deadline:
+            raise RuntimeError(f"Ollama não respondeu após {OLLAMA_WAIT_TIMEOUT:.0f}s")
+        await asyncio.sleep(1.0)
+
+async def _pull_model(client: httpx.AsyncClient) -> None:
+    """Baixa o modelo em streaming, registrando o progresso no log; falhas levantam RuntimeError"""
+    last_status = None
+    async with client.stream(
+        "POST", f"{OLLAMA_URL}/api/pull", json={"name": OLLAMA_MODEL}, timeout=None
+    ) as response:
+        if response.status_code != 200:
+            body = (await response.aread()).decode(errors="replace")
+            raise RuntimeError(f"Pull de {OLLAMA_MODEL} retornou status {response.status_code}: {body}")
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            # O Ollama reporta falhas no meio do stream como {"error": "..."}
+            if "error" in event:
+                raise RuntimeError(f"Pull de {OLLAMA_MODEL} falhou: {event['error']}")
+            status = event.get("status")
+            if status != last_status:
+                logger.info(f"📥 Pull {OLLAMA_MODEL}: {status}")
+                last_status = status
+
+def _has_model(models: List[str]) -> bool:
+    return any(name == OLLAMA_MODEL or name.startswith(f"{OLLAMA_MODEL}:") for name in models)
+
+async def _prepare_ollama() -> None:
+    """Aguarda o Ollama e garante que o modelo existe; levanta exceção em caso de falha"""
+    phase_start = time.perf_counter()
+    models = await _wait_for_ollama(ollama_client)
+    STARTUP_TIMINGS["ollama_wait"] = round(time.perf_counter() - phase_start, 3)
+    
+    phase_start = time.perf_counter()
+    if not _has_model(models):
+        readiness["detail"] = f"baixando modelo {OLLAMA_MODEL}"
+        logger.info(f"📥 Modelo {OLLAMA_MODEL} não encontrado, puxando em segundo plano...")
+        await _pull_model(ollama_client)
+        # Só fica pronto se o modelo aparecer de fato em /api/tags
+        if not _has_model(await _wait_for_ollama(ollama_client)):
+            raise RuntimeError(f"Modelo {OLLAMA_MODEL} não aparece em /api/tags após o pull")
+    STARTUP_TIMINGS["model_check"] = round(time.perf_counter() - phase_start, 3)
+
+async def _prepare_backend() -> None:
+    """Verifica Ollama e modelo em segundo plano, sem atrasar o servidor HTTP"""
+    if ollama_cassette is not None and ollama_cassette.mode == "replay":
+        readiness.update(status="ok", detail="replay do cassete (sem Ollama)")
+        return
+    # Enquanto falhar, o health check mostra "error" e a preparação recomeça
+    # a cada OLLAMA_RETRY_INTERVAL (o Ollama pode subir ou voltar depois)
+    while True:
+        try:
+            await _prepare_ollama()
+            break
+        except Exception as e:
+            readiness.update(status="error", detail=f"{e} (nova tentativa em {OLLAMA_RETRY_INTERVAL:.0f}s)")
+            logger.error(f"❌ Falha ao preparar o Ollama: {e}; nova tentativa em {OLLAMA_RETRY_INTERVAL:.0f}s")
+            await asyncio.sleep(OLLAMA_RETRY_INTERVAL)
+    
+    readiness.update(status="ok", detail="pronto")
+    STARTUP_TIMINGS["total_until_ready"] = round(time.perf_counter() - _PROCESS_START, 3)
+    logger.info(f"✅ Agent1 pronto. Tempos de inicialização: {STARTUP_TIMINGS}")
+
+_background_tasks = set()
+
+@app.on_event("startup")
+async def start_background_preparation():
+    global ollama_client
+    STARTUP_TIMINGS["server_up"] = round(time.perf_counter() - _PROCESS_START, 3)
+    ollama_client = httpx.AsyncClient(timeout=OLLAMA_TIMEOUT)
+    task = asyncio.create_task(_prepare_backend())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("shutdown")
+async def close_ollama_client():
+    # A preparação pode estar esperando uma nova tentativa com o cliente
+    for task in list(_background_tasks):
+        task.cancel()
+    if ollama_client is not None:
+        await ollama_client.aclose()
+
 # Registrar os tools como endpoints
 @app.get("/")
 async def health():
-    """Health check endpoint"""
-    return {"status": "ok", "service": "Agent1-Llama-Local"}
+    """Health check endpoint ("starting" até o Ollama e o modelo estarem prontos)"""
+    return {
+        "status": readiness["status"],
+        "detail": readiness["detail"],
+        "service": "Agent1-Llama-Local",
+        "model": OLLAMA_MODEL,
+        "startup": STARTUP_TIMINGS
+    }
+
+@app.get("/queue")
+async def queue_metrics():
+    """Fila do Ollama deste worker: vagas em uso e espera por classe de prioridade"""
+    return {"worker_pid": os.getpid(), **ollama_limiter.metrics()}
+
+def _remaining_seconds(headers: Mapping[str, str]) -> float:
+    """Prazo restante enviado pelo chamador; sem cabeçalho, o teto OLLAMA_TIMEOUT"""
+    header = headers.get(DEADLINE_HEADER)
+    try:
+        return min(OLLAMA_TIMEOUT, int(header) / 1000) if header else OLLAMA_TIMEOUT
+    except ValueError:
+        return OLLAMA_TIMEOUT
 
 @app.post("/api/tools/generate_draft")
-async def api_generate_draft(request: GenerateDraftRequest):
+async def api_generate_draft(request: GenerateDraftRequest, http_request: Request):
     """API endpoint para gerar rascunho - aceita JSON body"""
+    return await handle_generate_draft(request, http_request.headers)
+
+async def handle_generate_draft(request: GenerateDraftRequest, headers: Mapping[str, str]) -> Dict:
+    """Gera o(s) rascunho(s); chamado pelo endpoint HTTP ou direto, no modo monólito"""
+    remaining = _remaining_seconds(headers)
+    if remaining <= 0:
+        raise HTTPException(status_code=504, detail="Prazo da requisição esgotado")
+    priority = headers.get(PRIORITY_HEADER, "interactive").lower()
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"{PRIORITY_HEADER} deve ser: {', '.join(PRIORITY_CLASSES)}")
     try:
-        logger.info(f"📝 API Request: topic={request.topic}, style={request.style}, tone={request.tone}")
-        result = await generate_draft(request.topic, request.style, request.tone)
+        logger.info(f"📝 API Request: topic={request.topic}, style={request.style}, tone={request.tone}, variants={request.variants}, priority={priority}")
+        if request.variants > 1:
+            work = _generate_drafts(request.topic, request.style, request.tone, request.variants, priority)
+        else:
+            work = _generate_draft(request.topic, request.style, request.tone, priority)
+        # Ao estourar o prazo a chamada ao Ollama é cancelada (a conexão fecha e a geração para)
+        results = await asyncio.wait_for(work, timeout=remaining)
+        if request.variants == 1:
+            results = [results]
         return {
-            "content": [{"type": "text", "text": result}]
+            "content": [{"type": "text", "text": draft} for draft, _ in results],
+            "usage": _sum_usage([usage for _, usage in results])
         }
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱️ Prazo de {remaining:.1f}s esgotado; geração cancelada")
+        raise HTTPException(status_code=504, detail="Prazo da requisição esgotado")
     except Exception as e:
         logger.error(f"❌ Erro no endpoint: {e}")
         return {
             "error": str(e),
-            "content": [{"type": "text", "text": f"Erro: {str(e)}"}]
+            "content": [{"type": "text", "text": f"Erro: {str(e)}"}],
+            "usage": _empty_usage()
         }
 
 if __name__ == "__main__":
     print("✅ Iniciando servidor MCP Agent1 na porta 8001...")
     logger.info("🚀 Servidor MCP iniciando na porta 8001")
     
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # A fila de prioridade (ollama_limiter) vive no processo: com N workers o
+    # Ollama receberia N x OLLAMA_MAX_PARALLEL gerações e a prioridade só
+    # valeria dentro de cada worker. O Agent 1 só espera o Ollama, então
+    # roda sempre com um único worker.
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1:
+        logger.warning(f"⚠️ WORKERS={workers} ignorado: o Agent1 roda com um único worker (fila de prioridade)")
+    uvicorn.run("app:app", host="0.0.0.0", port=8001, workers=1)
\ No newline at end of file
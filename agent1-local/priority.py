@@ -0,0 +1,106 @@
+"""
+Fila com prioridade na frente das chamadas ao Ollama
+
+O Ollama em CPU só roda poucas gerações ao mesmo tempo. O limitador deixa
+passar no máximo `max_parallel` chamadas e, quando há fila, atende primeiro
+as requisições interativas. Para o lote não morrer de fome, cada classe tem
+um atraso em segundos: a ordem da fila é `chegada + atraso da classe`, então
+um pedido em lote que espera mais que `aging_seconds` passa à frente de
+interativos que chegaram depois.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+PRIORITY_CLASSES = ("interactive", "batch")
+
+
+class PriorityLimiter:
+    """Semáforo com classes de prioridade, envelhecimento e métricas de espera"""
+
+    def __init__(self, max_parallel: int = 2, aging_seconds: float = 30.0):
+        self.max_parallel = max_parallel
+        self.delays = {"interactive": 0.0, "batch": aging_seconds}
+        self._active = 0
+        self._heap: List[Tuple[float, int, str, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._waits: Dict[str, deque] = {name: deque(maxlen=500) for name in PRIORITY_CLASSES}
+        self._counters = {name: {"served": 0, "total_wait": 0.0, "max_wait": 0.0} for name in PRIORITY_CLASSES}
+
+    def _queued(self, priority: str) -> int:
+        return sum(1 for _, _, name, future in self._heap if name == priority and not future.done())
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive"):
+        """Ocupa uma vaga de geração durante o bloco `async with`"""
+        if priority not in self.delays:
+            priority = "interactive"
+        enqueued = time.monotonic()
+        while self._heap and self._heap[0][3].done():
+            heapq.heappop(self._heap)  # esperas canceladas antes de receber a vaga
+
+        if self._active < self.max_parallel and not self._heap:
+            self._active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._heap, (enqueued + self.delays[priority], next(self._seq), priority, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Cancelado depois de receber a vaga: devolve para o próximo da fila
+                if future.done() and not future.cancelled():
+                    self._release()
+                raise
+
+        self._record(priority, time.monotonic() - enqueued)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self._active -= 1
+        while self._heap and self._active < self.max_parallel:
+            _, _, _, future = heapq.heappop(self._heap)
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+
+    def _record(self, priority: str, wait: float) -> None:
+        self._waits[priority].append(wait)
+        counters = self._counters[priority]
+        counters["served"] += 1
+        counters["total_wait"] += wait
+        counters["max_wait"] = max(counters["max_wait"], wait)
+
+    @staticmethod
+    def _percentile(values: List[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def metrics(self) -> Dict:
+        classes = {}
+        for name in PRIORITY_CLASSES:
+            counters = self._counters[name]
+            waits = list(self._waits[name])
+            classes[name] = {
+                "queued": self._queued(name),
+                "served": counters["served"],
+                "avg_wait_s": round(counters["total_wait"] / counters["served"], 3) if counters["served"] else 0.0,
+                "p50_wait_s": round(self._percentile(waits, 50), 3),
+                "p95_wait_s": round(self._percentile(waits, 95), 3),
+                "max_wait_s": round(counters["max_wait"], 3),
+            }
+        return {
+            "max_parallel": self.max_parallel,
+            "active": self._active,
+            "aging_seconds": self.delays["batch"],
+            "classes": classes,
+        }
@@ -1,32 +1,130 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import google.generativeai as genai
+import time
+_PROCESS_START = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field
+import asyncio
 import os
+import threading
 from dotenv import load_dotenv
-from typing import List, Optional
+from typing import Any, Dict, List, Mapping, Optional
 import base64
+import hashlib
+import json
+import logging
+import random
+import re
+import uuid
 from pathlib import Path
-from datetime import datetime
+from types import SimpleNamespace
+
+from stats import PromptStatsStore
+from shared.cassette import request_key, shared_cassette
+from shared.codec import CodecMiddleware
+from shared.profiling import ProfilingMiddleware
+from shared.retention import RetentionManager
+from prompts import PromptTemplate, TEMPLATES, IMPROVE_CAPTION, HASHTAGS, IMPROVE_VARIANTS, IMAGE_PROMPT
+
+# Tempo gasto em cada fase da inicialização (segundos)
+STARTUP_TIMINGS: Dict[str, float] = {"imports": round(time.perf_counter() - _PROCESS_START, 3)}
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_phase_start = time.perf_counter()
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Gravação/reprodução das chamadas ao Gemini (CASSETTE_MODE=record|replay);
+# em replay o agente roda offline, sem chave
+gemini_cassette = shared_cassette("gemini", default_dir="/app/outputs/cassettes")
+REPLAYING = gemini_cassette is not None and gemini_cassette.mode == "replay"
+
 # Configurar Gemini API
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
+if not GOOGLE_API_KEY and not REPLAYING:
     raise ValueError("GOOGLE_API_KEY não encontrada no .env")
 
-genai.configure(api_key=GOOGLE_API_KEY)
+STARTUP_TIMINGS["config"] = round(time.perf_counter() - _phase_start, 3)
+
+# Estado de prontidão: "starting" até o SDK e os modelos estarem carregados
+readiness = {"status": "starting", "detail": "carregando SDK do Gemini"}
+
+# O SDK do Gemini é pesado: importado e configurado fora do caminho crítico
+_genai_module = None
+_genai_lock = threading.Lock()
+
+
+def _genai():
+    """Importa e configura o google.generativeai na primeira utilização"""
+    global _genai_module
+    if _genai_module is None:
+        with _genai_lock:
+            if _genai_module is None:
+                phase_start = time.perf_counter()
+                import google.generativeai as genai
+                STARTUP_TIMINGS["sdk_import"] = round(time.perf_counter() - phase_start, 3)
+                
+                phase_start = time.perf_counter()
+                genai.configure(api_key=GOOGLE_API_KEY)
+                STARTUP_TIMINGS["sdk_config"] = round(time.perf_counter() - phase_start, 3)
+                _genai_module = genai
+    return _genai_module
+
+
+MODEL_NAME = "models/gemini-2.5-flash"
+
+# Fração das chamadas em que o prompt no formato antigo (instrução estática +
+# campos variáveis, tudo no conteúdo) também é contado, para comparar em /prompts
+PROMPT_BASELINE_SAMPLE_RATE = float(os.getenv("PROMPT_BASELINE_SAMPLE_RATE", "0.1"))
+
+# Teto por requisição quando o chamador não envia prazo (X-Deadline-Ms)
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "120"))
+DEADLINE_HEADER = "X-Deadline-Ms"
 
 app = FastAPI(title="Agent 2 - Google Gemini")
 
+# Profiling sob demanda (cabeçalho X-Profile com PROFILING=1, ou PROFILE_SAMPLE_RATE)
+ProfilingMiddleware.install(app, service="agent2", default_dir="/app/outputs/profiles")
+
+# Corpos JSON com gzip quando o cliente negocia
+CodecMiddleware.install(app)
+
 # Diretório para salvar imagens
-OUTPUTS_DIR = Path("/app/outputs")
-OUTPUTS_DIR.mkdir(exist_ok=True)
+OUTPUTS_DIR = Path(os.getenv("OUTPUTS_DIR", "/app/outputs"))
+OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
+
+# Descrições de imagem endereçadas por conteúdo (sha256 do texto)
+IMAGE_PROMPTS_DIR = OUTPUTS_DIR / "image_prompts"
+IMAGE_PROMPTS_DIR.mkdir(exist_ok=True)
+
+# Descrições antigas vão para segmentos comprimidos (RETENTION_ENABLED=1) e
+# continuam consultáveis em /image-prompts
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "0") == "1"
+retention = RetentionManager.from_env(
+    IMAGE_PROMPTS_DIR, "*/*.txt", "image_prompts", default_archive_dir=OUTPUTS_DIR / "archive"
+)
+
+# Contadores de tokens por template, compartilhados entre workers
+prompt_stats = PromptStatsStore(OUTPUTS_DIR / "prompt_stats.db")
 
 
 # ============= MODELOS =============
 
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            total_tokens=self.total_tokens + other.total_tokens,
+        )
+
+
 class ImproveCaptionRequest(BaseModel):
     draft_text: str
     style: Optional[str] = "casual"  # "casual", "profissional", "engraçado"
@@ -38,6 +136,28 @@ class ImproveCaptionResponse(BaseModel):
     hashtags: List[str]
     agent: str
     model: str
+    usage: TokenUsage = TokenUsage()
+
+
+class ImproveVariantsRequest(BaseModel):
+    drafts: List[str] = Field(..., min_length=1, max_length=8)
+    style: Optional[str] = "casual"
+    target_audience: Optional[str] = "público geral"
+
+
+class RankedVariant(BaseModel):
+    index: int
+    score: float
+    improved_text: str
+    hashtags: List[str]
+
+
+class ImproveVariantsResponse(BaseModel):
+    best: RankedVariant
+    alternatives: List[RankedVariant]
+    agent: str
+    model: str
+    usage: TokenUsage = TokenUsage()
 
 
 class GenerateImageRequest(BaseModel):
@@ -46,10 +166,139 @@ class GenerateImageRequest(BaseModel):
 
 
 class GenerateImageResponse(BaseModel):
-    image_path: str
-    prompt_used: str
+    image_prompt: str
+    prompt_hash: str
     agent: str
     model: str
+    usage: TokenUsage = TokenUsage()
+
+
+# ============= MODELOS DE LONGA DURAÇÃO =============
+
+_models: Dict[str, Any] = {}
+
+
+def get_model(template: PromptTemplate) -> Any:
+    """Retorna (criando na primeira vez) o modelo com a parte estática do template
+
+    A instrução vai como system instruction (cobrada como entrada a cada
+    chamada); o SDK fixado (0.5.4) não tem context caching explícito.
+    """
+    model = _models.get(template.key)
+    if model is None:
+        model = _genai().GenerativeModel(MODEL_NAME, system_instruction=template.system_instruction)
+        _models[template.key] = model
+    return model
+
+
+def _count_baseline(template: PromptTemplate, contents: str, input_tokens: int) -> None:
+    """Conta os tokens do prompt no formato antigo e registra ao lado dos cobrados (executa em thread)"""
+    model = _models.get("baseline")
+    if model is None:
+        model = _models["baseline"] = _genai().GenerativeModel(MODEL_NAME)
+    before = model.count_tokens(f"{template.system_instruction}\n\n{contents}").total_tokens
+    prompt_stats.add_baseline(template.key, input_tokens_before=before, input_tokens_after=input_tokens)
+
+
+async def _measure_baseline(template: PromptTemplate, contents: str, input_tokens: int) -> None:
+    try:
+        await asyncio.to_thread(_count_baseline, template, contents, input_tokens)
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao contar tokens do formato antigo de {template.key}: {e}")
+
+
+async def _record_usage(template: PromptTemplate, response) -> TokenUsage:
+    """Acumula (SQLite, fora do event loop) e retorna a contagem de tokens reportada pelo Gemini"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return TokenUsage()
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    completion_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    try:
+        await asyncio.to_thread(
+            prompt_stats.add,
+            template.key,
+            input_tokens=prompt_tokens,
+            cached_input_tokens=getattr(usage, "cached_content_token_count", 0) or 0,
+            output_tokens=completion_tokens,
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao registrar estatísticas de {template.key}: {e}")
+    return TokenUsage(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=getattr(usage, "total_token_count", 0) or prompt_tokens + completion_tokens,
+    )
+
+
+def _request_deadline(headers: Mapping[str, str]) -> float:
+    """Prazo (time.monotonic) enviado pelo chamador; sem cabeçalho, GEMINI_TIMEOUT"""
+    budget = GEMINI_TIMEOUT
+    header = headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            budget = min(budget, int(header) / 1000)
+        except ValueError:
+            pass
+    return time.monotonic() + budget
+
+
+def _response_snapshot(response) -> Dict:
+    """Texto e contagem de tokens de uma resposta do Gemini (o que os endpoints usam)"""
+    usage = getattr(response, "usage_metadata", None)
+    try:
+        text = response.text
+    except ValueError:
+        text = ""  # resposta bloqueada/sem candidatos
+    return {
+        "text": text,
+        "usage_metadata": {
+            name: getattr(usage, name, 0) or 0
+            for name in ("prompt_token_count", "candidates_token_count",
+                         "cached_content_token_count", "total_token_count")
+        } if usage is not None else None,
+    }
+
+
+def _replayed_response(snapshot: Dict) -> Any:
+    usage = snapshot.get("usage_metadata")
+    return SimpleNamespace(
+        text=snapshot["text"],
+        usage_metadata=SimpleNamespace(**usage) if usage is not None else None
+    )
+
+
+async def _generate(template: PromptTemplate, deadline: float, contents: str, **kwargs) -> Any:
+    """Chama o Gemini sem bloquear o event loop, desistindo quando o prazo acaba"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError()
+    key = request_key(template.key, contents, kwargs)
+    if REPLAYING:
+        entry = await asyncio.wait_for(gemini_cassette.replay(key), timeout=remaining)
+        return _replayed_response(entry["response"])
+    
+    start = time.perf_counter()
+    response = await asyncio.wait_for(
+        get_model(template).generate_content_async(
+            contents, request_options={"timeout": remaining}, **kwargs
+        ),
+        timeout=remaining
+    )
+    if gemini_cassette is not None:
+        gemini_cassette.record(
+            key, {"template": template.key, "contents": contents, **kwargs},
+            _response_snapshot(response), time.perf_counter() - start
+        )
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and random.random() < PROMPT_BASELINE_SAMPLE_RATE:
+        # Fora do caminho da resposta: count_tokens é outra chamada de rede
+        task = asyncio.create_task(_measure_baseline(
+            template, contents, getattr(usage, "prompt_token_count", 0) or 0
+        ))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return response
 
 
 # ============= ENDPOINTS =============
@@ -59,10 +308,12 @@ async def root():
     return {
         "agent": "agent2-gemini",
         "models": {
-            "text": "models/gemini-2.5-flash",
-            "image_description": "models/gemini-2.5-flash"
+            "text": MODEL_NAME,
+            "image_description": MODEL_NAME
         },
-        "status": "online"
+        "status": readiness["status"],
+        "detail": readiness["detail"],
+        "startup": STARTUP_TIMINGS
     }
 
 
@@ -75,6 +326,11 @@ async def health():
                 status_code=503,
                 detail="GOOGLE_API_KEY não configurada corretamente"
             )
+        if readiness["status"] != "online":
+            raise HTTPException(
+                status_code=503,
+                detail=f"Agente {readiness['status']}: {readiness['detail']}"
+            )
         return {
             "status": "healthy",
             "gemini_api": "configured"
@@ -87,7 +343,7 @@ async def health():
 
 
 @app.post("/improve", response_model=ImproveCaptionResponse)
-async def improve_caption(request: ImproveCaptionRequest):
+async def improve_caption(request: ImproveCaptionRequest, http_request: Request):
     """
     Melhora uma caption de Instagram usando Gemini
     
@@ -102,33 +358,21 @@ async def improve_caption(request: ImproveCaptionRequest):
         agent: Nome do agente
         model: Modelo usado
     """
-    try:
-        # Criar prompt para melhorar caption
-        prompt = f"""Você é um especialista em marketing digital e criação de conteúdo para Instagram.
-
-TAREFA: Melhore a caption abaixo para torná-la mais profissional, envolvente e otimizada para o Instagram.
-
-CAPTION ORIGINAL:
-{request.draft_text}
+    return await handle_improve_caption(request, _request_deadline(http_request.headers))
 
-DIRETRIZES:
-- Estilo: {request.style}
-- Público-alvo: {request.target_audience}
-- Corrija erros gramaticais e ortográficos
-- Torne o texto mais envolvente e com gatilhos emocionais
-- Mantenha entre 2-5 linhas (não muito longo)
-- Use emojis estrategicamente (não exagere)
-- Adicione call-to-action sutil se apropriado
-- NÃO inclua hashtags no texto melhorado
 
-FORMATO DA RESPOSTA:
-Retorne APENAS o texto melhorado, sem hashtags.
-
-TEXTO MELHORADO:"""
+async def handle_improve_caption(request: ImproveCaptionRequest, deadline: float) -> ImproveCaptionResponse:
+    """Executa a chamada; usado pelo endpoint HTTP ou direto, no modo monólito"""
+    try:
+        prompt = IMPROVE_CAPTION.render(
+            draft_text=request.draft_text,
+            style=request.style,
+            target_audience=request.target_audience
+        )
 
         # Chamar Gemini para texto
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-        response = model.generate_content(prompt)
+        response = await _generate(IMPROVE_CAPTION, deadline, prompt)
+        usage = await _record_usage(IMPROVE_CAPTION, response)
         
         if not response.text:
             raise HTTPException(
@@ -139,22 +383,10 @@ TEXTO MELHORADO:"""
         improved_text = response.text.strip()
         
         # Gerar hashtags relevantes
-        hashtags_prompt = f"""Com base nesta caption do Instagram, sugira 5-10 hashtags relevantes e populares.
-
-CAPTION:
-{improved_text}
-
-REGRAS:
-- Misture hashtags populares e nichos
-- Inclua hashtags em português e inglês quando relevante
-- Foque em engajamento e alcance
-- NÃO use # na frente, apenas as palavras
-
-FORMATO: Retorne apenas as hashtags separadas por vírgula, sem numeração ou marcadores.
-
-HASHTAGS:"""
-
-        hashtags_response = model.generate_content(hashtags_prompt)
+        hashtags_response = await _generate(
+            HASHTAGS, deadline, HASHTAGS.render(caption=improved_text)
+        )
+        usage += await _record_usage(HASHTAGS, hashtags_response)
         hashtags_text = hashtags_response.text.strip()
         
         # Processar hashtags
@@ -168,9 +400,14 @@ HASHTAGS:"""
             improved_text=improved_text,
             hashtags=hashtags,
             agent="agent2-gemini",
-            model="models/gemini-2.5-flash"
+            model=MODEL_NAME,
+            usage=usage
         )
         
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Prazo da requisição esgotado")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -178,8 +415,125 @@ HASHTAGS:"""
         )
 
 
+def _parse_json_response(text: str) -> dict:
+    """Extrai o JSON da resposta do Gemini, tolerando blocos ```json```"""
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`")
+        if cleaned.lower().startswith("json"):
+            cleaned = cleaned[4:]
+    return json.loads(cleaned)
+
+
+@app.post("/improve-variants", response_model=ImproveVariantsResponse)
+async def improve_variants(request: ImproveVariantsRequest, http_request: Request):
+    """
+    Melhora e ranqueia várias captions em UMA única chamada ao Gemini
+    
+    Args:
+        drafts: Lista de rascunhos candidatos
+        style: Estilo desejado
+        target_audience: Público-alvo
+    
+    Returns:
+        best: Variante melhor avaliada (texto melhorado + hashtags)
+        alternatives: Demais variantes, em ordem decrescente de nota
+        agent: Nome do agente
+        model: Modelo usado
+    """
+    return await handle_improve_variants(request, _request_deadline(http_request.headers))
+
+
+async def handle_improve_variants(request: ImproveVariantsRequest, deadline: float) -> ImproveVariantsResponse:
+    """Executa a chamada; usado pelo endpoint HTTP ou direto, no modo monólito"""
+    try:
+        drafts_block = "\n\n".join(
+            f"[{i}]\n{draft}" for i, draft in enumerate(request.drafts)
+        )
+        prompt = IMPROVE_VARIANTS.render(
+            style=request.style,
+            target_audience=request.target_audience,
+            count=len(request.drafts),
+            drafts_block=drafts_block
+        )
+
+        response = await _generate(
+            IMPROVE_VARIANTS, deadline, prompt,
+            generation_config={"response_mime_type": "application/json"}
+        )
+        usage = await _record_usage(IMPROVE_VARIANTS, response)
+        
+        if not response.text:
+            raise HTTPException(
+                status_code=500,
+                detail="Gemini não retornou resposta"
+            )
+        
+        parsed = _parse_json_response(response.text)
+        variants = []
+        for item in parsed.get("variants", []):
+            index = int(item.get("index", -1))
+            improved_text = str(item.get("improved_text", "")).strip()
+            if not 0 <= index < len(request.drafts) or not improved_text:
+                continue
+            variants.append(RankedVariant(
+                index=index,
+                score=float(item.get("score", 0)),
+                improved_text=improved_text,
+                hashtags=[
+                    f"#{str(tag).strip().replace('#', '')}"
+                    for tag in item.get("hashtags", [])
+                    if str(tag).strip()
+                ][:10]
+            ))
+        
+        if not variants:
+            raise HTTPException(
+                status_code=500,
+                detail="Gemini não retornou variantes válidas"
+            )
+        
+        variants.sort(key=lambda v: v.score, reverse=True)
+        
+        return ImproveVariantsResponse(
+            best=variants[0],
+            alternatives=variants[1:],
+            agent="agent2-gemini",
+            model=MODEL_NAME,
+            usage=usage
+        )
+        
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Prazo da requisição esgotado")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao melhorar variantes: {str(e)}"
+        )
+
+
+def _image_prompt_path(prompt_hash: str) -> Path:
+    return IMAGE_PROMPTS_DIR / prompt_hash[:2] / f"{prompt_hash}.txt"
+
+
+def _store_image_prompt(image_prompt: str) -> str:
+    """Salva a descrição sob o sha256 do conteúdo e retorna o hash; textos idênticos não são regravados"""
+    data = image_prompt.encode("utf-8")
+    prompt_hash = hashlib.sha256(data).hexdigest()
+    path = _image_prompt_path(prompt_hash)
+    if not path.exists():
+        path.parent.mkdir(exist_ok=True)
+        # Escrita atômica: arquivo temporário único + rename
+        tmp_path = path.with_name(f".{prompt_hash}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    return prompt_hash
+
+
 @app.post("/generate-image", response_model=GenerateImageResponse)
-async def generate_image_description(request: GenerateImageRequest):
+async def generate_image_description(request: GenerateImageRequest, http_request: Request):
     """
     Gera uma DESCRIÇÃO DETALHADA de imagem usando Gemini
     
@@ -188,32 +542,23 @@ async def generate_image_description(request: GenerateImageRequest):
         style: Estilo visual (realistic, artistic, minimalist, etc)
     
     Returns:
-        image_path: Caminho onde a descrição foi salva
-        prompt_used: Prompt final usado
+        image_prompt: Descrição detalhada gerada
+        prompt_hash: sha256 da descrição (chave de consulta em /image-prompts)
         agent: Nome do agente
         model: Modelo usado
     """
-    try:
-        # Melhorar o prompt para gerar uma descrição de imagem
-        enhanced_prompt = f"""Você é um diretor de arte especialista em criar prompts para geradores de imagem de IA (como Midjourney ou DALL-E).
-Sua tarefa é expandir a ideia do usuário em um prompt rico e detalhado.
-
-IDÉIA ORIGINAL:
-- Prompt: {request.prompt}
-- Estilo: {request.style}
+    return await handle_generate_image_description(request, _request_deadline(http_request.headers))
 
-INSTRUÇÕES:
-- Crie um parágrafo único e detalhado.
-- Descreva a cena, a iluminação, as cores, a composição, a atmosfera e os detalhes finos.
-- Use palavras-chave que maximizem a qualidade da imagem gerada.
-- O resultado deve ser um prompt pronto para ser copiado e colado em uma ferramenta de IA.
 
-PROMPT DETALHADO:"""
-        
-        # Usar gemini-pro para DESCREVER a imagem
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
+async def handle_generate_image_description(request: GenerateImageRequest, deadline: float) -> GenerateImageResponse:
+    """Executa a chamada; usado pelo endpoint HTTP ou direto, no modo monólito"""
+    try:
+        # Apenas os campos variáveis; as instruções de diretor de arte já
+        # estão na system instruction do modelo
+        enhanced_prompt = IMAGE_PROMPT.render(prompt=request.prompt, style=request.style)
         
-        response = model.generate_content(enhanced_prompt)
+        response = await _generate(IMAGE_PROMPT, deadline, enhanced_prompt)
+        usage = await _record_usage(IMAGE_PROMPT, response)
 
         if not response.text:
             raise HTTPException(
@@ -221,21 +566,21 @@ PROMPT DETALHADO:"""
                 detail="Gemini não retornou uma descrição para a imagem."
             )
 
-        # Salvar a descrição em um arquivo .txt
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"image_prompt_{timestamp}.txt"
-        image_path = OUTPUTS_DIR / filename
-        
-        with open(image_path, "w", encoding="utf-8") as f:
-            f.write(f"Prompt detalhado para gerar imagem:\n\n{response.text}")
+        image_prompt = response.text.strip()
+        prompt_hash = await asyncio.to_thread(_store_image_prompt, image_prompt)
         
         return GenerateImageResponse(
-            image_path=f"Descrição de imagem salva em: {str(image_path)}",
-            prompt_used=enhanced_prompt,
+            image_prompt=image_prompt,
+            prompt_hash=prompt_hash,
             agent="agent2-gemini",
-            model="models/gemini-2.5-flash"
+            model=MODEL_NAME,
+            usage=usage
         )
         
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Prazo da requisição esgotado")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -243,6 +588,121 @@ PROMPT DETALHADO:"""
         )
 
 
+@app.get("/image-prompts/{prompt_hash}")
+async def get_image_prompt(prompt_hash: str):
+    """Consulta uma descrição de imagem pelo seu hash de conteúdo"""
+    if not re.fullmatch(r"[0-9a-f]{64}", prompt_hash):
+        raise HTTPException(status_code=400, detail="Hash inválido (esperado sha256 hexadecimal)")
+    path = _image_prompt_path(prompt_hash)
+    if not path.exists():
+        path = retention.archive.get(path.name)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Descrição de imagem não encontrada")
+    return {
+        "prompt_hash": prompt_hash,
+        "image_prompt": path.read_text(encoding="utf-8")
+    }
+
+
+@app.get("/retention")
+async def get_retention_status():
+    """Descrições soltas, segmentos compactados e relatórios das últimas passadas"""
+    status = await asyncio.to_thread(retention.status)
+    status["enabled"] = RETENTION_ENABLED
+    return status
+
+
+@app.post("/retention/run")
+async def run_retention():
+    """Roda uma passada de compactação agora e devolve o espaço recuperado"""
+    report = await asyncio.to_thread(retention.run_once)
+    if "skipped" in report:
+        raise HTTPException(status_code=409, detail=report["skipped"])
+    return report
+
+
+@app.get("/prompts")
+async def list_prompts():
+    """
+    Lista os templates ativos e a contagem de tokens de entrada
+    
+    `input_tokens` é o total cobrado com a instrução estática enviada como
+    system instruction. Numa amostra das chamadas (PROMPT_BASELINE_SAMPLE_RATE),
+    o prompt no formato antigo (instrução + campos variáveis no conteúdo) é
+    contado com count_tokens: `baseline` compara, nessas mesmas chamadas, o
+    custo antigo (`input_tokens_before`) com o cobrado (`input_tokens_after`).
+    """
+    templates = {}
+    all_stats = await asyncio.to_thread(prompt_stats.all)
+    for template in TEMPLATES.values():
+        stats = all_stats.get(template.key, {})
+        baseline = stats.get("baseline", {})
+        before = baseline.get("input_tokens_before", 0)
+        after = baseline.get("input_tokens_after", 0)
+        templates[template.name] = {
+            "version": template.version,
+            "loaded_in_worker": template.key in _models,
+            "requests": stats.get("requests", 0),
+            "input_tokens": stats.get("input_tokens", 0),
+            "cached_input_tokens": stats.get("cached_input_tokens", 0),
+            "output_tokens": stats.get("output_tokens", 0),
+            "baseline": {
+                "requests": baseline.get("requests", 0),
+                "input_tokens_before": before,
+                "input_tokens_after": after,
+                "saved_tokens": before - after,
+            },
+        }
+    return {
+        "model": MODEL_NAME,
+        "worker_pid": os.getpid(),
+        "baseline_sample_rate": PROMPT_BASELINE_SAMPLE_RATE,
+        "templates": templates,
+    }
+
+
+def _warm_up() -> None:
+    """Importa o SDK e cria os modelos de longa duração (executa em thread)"""
+    _genai()
+    phase_start = time.perf_counter()
+    for template in TEMPLATES.values():
+        get_model(template)
+    STARTUP_TIMINGS["model_setup"] = round(time.perf_counter() - phase_start, 3)
+
+
+async def _prepare_models() -> None:
+    if REPLAYING:
+        readiness.update(status="online", detail="replay do cassete (sem Gemini)")
+        return
+    try:
+        await asyncio.to_thread(_warm_up)
+        readiness.update(status="online", detail="pronto")
+        STARTUP_TIMINGS["total_until_ready"] = round(time.perf_counter() - _PROCESS_START, 3)
+        logger.info(f"✅ Agent2 pronto. Tempos de inicialização: {STARTUP_TIMINGS}")
+    except Exception as e:
+        readiness.update(status="error", detail=str(e))
+        logger.error(f"❌ Falha ao preparar o Gemini: {e}")
+
+
+_background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_background_preparation():
+    """Sobe o servidor HTTP imediatamente; SDK e modelos são carregados em segundo plano"""
+    STARTUP_TIMINGS["server_up"] = round(time.perf_counter() - _PROCESS_START, 3)
+    task = asyncio.create_task(_prepare_models())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    if RETENTION_ENABLED:
+        retention.start()
+
+
+@app.on_event("shutdown")
+async def stop_retention():
+    await retention.stop()
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8002)
+    uvicorn.run("app:app", host="0.0.0.0", port=8002, workers=int(os.getenv("WORKERS", "1")))
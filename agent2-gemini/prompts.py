@@ -0,0 +1,124 @@
+"""
+Templates de prompt versionados do Agent 2
+
+A parte estática de cada template (papel, diretrizes, formato da resposta)
+é enviada como system instruction de um modelo de longa duração. Por
+requisição, apenas os campos variáveis de `user_template` são enviados.
+Ao alterar o texto estático de um template, incremente `version`.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    version: str
+    system_instruction: str
+    user_template: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def render(self, **fields) -> str:
+        """Monta a parte variável do prompt"""
+        return self.user_template.format(**fields)
+
+
+IMPROVE_CAPTION = PromptTemplate(
+    name="improve_caption",
+    version="1",
+    system_instruction="""Você é um especialista em marketing digital e criação de conteúdo para Instagram.
+
+TAREFA: Melhore a caption recebida para torná-la mais profissional, envolvente e otimizada para o Instagram.
+
+DIRETRIZES:
+- Respeite o estilo e o público-alvo informados
+- Corrija erros gramaticais e ortográficos
+- Torne o texto mais envolvente e com gatilhos emocionais
+- Mantenha entre 2-5 linhas (não muito longo)
+- Use emojis estrategicamente (não exagere)
+- Adicione call-to-action sutil se apropriado
+- NÃO inclua hashtags no texto melhorado
+
+FORMATO DA RESPOSTA:
+Retorne APENAS o texto melhorado, sem hashtags.""",
+    user_template="""CAPTION ORIGINAL:
+{draft_text}
+
+Estilo: {style}
+Público-alvo: {target_audience}
+
+TEXTO MELHORADO:""",
+)
+
+
+HASHTAGS = PromptTemplate(
+    name="hashtags",
+    version="1",
+    system_instruction="""Com base na caption do Instagram recebida, sugira 5-10 hashtags relevantes e populares.
+
+REGRAS:
+- Misture hashtags populares e nichos
+- Inclua hashtags em português e inglês quando relevante
+- Foque em engajamento e alcance
+- NÃO use # na frente, apenas as palavras
+
+FORMATO: Retorne apenas as hashtags separadas por vírgula, sem numeração ou marcadores.""",
+    user_template="""CAPTION:
+{caption}
+
+HASHTAGS:""",
+)
+
+
+IMPROVE_VARIANTS = PromptTemplate(
+    name="improve_variants",
+    version="1",
+    system_instruction="""Você é um especialista em marketing digital e criação de conteúdo para Instagram.
+
+TAREFA: Você receberá rascunhos de caption numerados. Para CADA rascunho:
+1. Melhore o texto para torná-lo profissional, envolvente e otimizado para o Instagram.
+2. Sugira de 5 a 10 hashtags relevantes (sem o caractere #).
+3. Dê uma nota de 0 a 10 para o potencial de engajamento do texto melhorado.
+
+DIRETRIZES:
+- Respeite o estilo e o público-alvo informados
+- Corrija erros gramaticais e ortográficos
+- Mantenha entre 2-5 linhas, use emojis estrategicamente
+- NÃO inclua hashtags no texto melhorado
+
+FORMATO DA RESPOSTA (JSON puro, sem comentários):
+{"variants": [{"index": 0, "score": 8.5, "improved_text": "...", "hashtags": ["tag1", "tag2"]}]}""",
+    user_template="""Estilo: {style}
+Público-alvo: {target_audience}
+
+RASCUNHOS ({count}):
+{drafts_block}""",
+)
+
+
+IMAGE_PROMPT = PromptTemplate(
+    name="image_prompt",
+    version="1",
+    system_instruction="""Você é um diretor de arte especialista em criar prompts para geradores de imagem de IA (como Midjourney ou DALL-E).
+Sua tarefa é expandir a ideia do usuário em um prompt rico e detalhado.
+
+INSTRUÇÕES:
+- Crie um parágrafo único e detalhado.
+- Descreva a cena, a iluminação, as cores, a composição, a atmosfera e os detalhes finos.
+- Use palavras-chave que maximizem a qualidade da imagem gerada.
+- O resultado deve ser um prompt pronto para ser copiado e colado em uma ferramenta de IA.""",
+    user_template="""IDÉIA ORIGINAL:
+- Prompt: {prompt}
+- Estilo: {style}
+
+PROMPT DETALHADO:""",
+)
+
+
+TEMPLATES = {
+    template.name: template
+    for template in (IMPROVE_CAPTION, HASHTAGS, IMPROVE_VARIANTS, IMAGE_PROMPT)
+}
@@ -0,0 +1,88 @@
+"""
+Estatísticas de tokens por template do Agent 2
+Guardadas em SQLite para ficarem corretas com vários workers do uvicorn
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+
+class PromptStatsStore:
+    """Contadores de tokens por template (name@version), compartilhados entre processos"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS prompt_stats (
+                    template TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    input_tokens INTEGER NOT NULL DEFAULT 0,
+                    cached_input_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Amostra: tokens do prompt no formato antigo x cobrados na mesma chamada
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS prompt_baseline (
+                    template TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    input_tokens_before INTEGER NOT NULL DEFAULT 0,
+                    input_tokens_after INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, template: str, input_tokens: int, cached_input_tokens: int, output_tokens: int) -> None:
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO prompt_stats (template, requests, input_tokens, cached_input_tokens, output_tokens)
+                VALUES (?, 1, ?, ?, ?)
+                ON CONFLICT (template) DO UPDATE SET
+                    requests = requests + 1,
+                    input_tokens = input_tokens + excluded.input_tokens,
+                    cached_input_tokens = cached_input_tokens + excluded.cached_input_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens
+            """, (template, input_tokens, cached_input_tokens, output_tokens))
+
+    def add_baseline(self, template: str, input_tokens_before: int, input_tokens_after: int) -> None:
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO prompt_baseline (template, requests, input_tokens_before, input_tokens_after)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT (template) DO UPDATE SET
+                    requests = requests + 1,
+                    input_tokens_before = input_tokens_before + excluded.input_tokens_before,
+                    input_tokens_after = input_tokens_after + excluded.input_tokens_after
+            """, (template, input_tokens_before, input_tokens_after))
+
+    def all(self) -> Dict[str, Dict]:
+        with self._connect() as conn:
+            stats = {
+                row["template"]: {
+                    "requests": row["requests"],
+                    "input_tokens": row["input_tokens"],
+                    "cached_input_tokens": row["cached_input_tokens"],
+                    "output_tokens": row["output_tokens"],
+                }
+                for row in conn.execute("SELECT * FROM prompt_stats")
+            }
+            for row in conn.execute("SELECT * FROM prompt_baseline"):
+                stats.setdefault(row["template"], {})["baseline"] = {
+                    "requests": row["requests"],
+                    "input_tokens_before": row["input_tokens_before"],
+                    "input_tokens_after": row["input_tokens_after"],
+                }
+            return stats
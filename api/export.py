@@ -0,0 +1,175 @@
+"""
+Exportação em massa do histórico (NDJSON, NDJSON gzip ou ZIP)
+
+Os arquivos são gerados sob demanda, registro a registro, sem arquivos
+temporários e com memória constante. A saída é determinística para o mesmo
+conjunto de arquivos, o que permite atender requisições Range (retomada de
+downloads interrompidos) regenerando o fluxo e pulando os bytes já enviados.
+"""
+
+import io
+import json
+import re
+import zipfile
+import zlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from shared.retention import SegmentArchive
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "ndjson.gz": ("application/gzip", "ndjson.gz"),
+    "zip": ("application/zip", "zip"),
+}
+
+_FILENAME_DATE = re.compile(r"^post_(\d{8})_")
+
+
+def select_history_files(
+    history_dir: Path, start: Optional[date] = None, end: Optional[date] = None,
+    archive: Optional[SegmentArchive] = None
+) -> List[Path]:
+    """Arquivos do histórico no intervalo [start, end], em ordem cronológica
+
+    A data vem do nome do arquivo (post_YYYYMMDD_...), sem abrir o JSON.
+    Com `archive`, inclui os posts já compactados (ArchivedFile, que expõe
+    `name`, `read_bytes()` e `stat()` como um Path); o arquivo solto vence.
+    """
+    selected = []
+    for path in sorted(history_dir.glob("post_*.json")):
+        match = _FILENAME_DATE.match(path.name)
+        if not match:
+            continue
+        day = datetime.strptime(match.group(1), "%Y%m%d").date()
+        if start and day < start:
+            continue
+        if end and day > end:
+            continue
+        selected.append(path)
+
+    if archive is not None:
+        loose = {path.name for path in selected}
+        archived = archive.entries(
+            start=f"post_{start:%Y%m%d}" if start else None,
+            end=f"post_{end + timedelta(days=1):%Y%m%d}" if end else None
+        )
+        selected.extend(entry for entry in archived if entry.name not in loose)
+        selected.sort(key=lambda path: path.name)
+    return selected
+
+
+def _matches_topic(data: dict, topic: Optional[str]) -> bool:
+    if not topic:
+        return True
+    return topic.casefold() in str(data.get("metadata", {}).get("topic", "")).casefold()
+
+
+def _iter_records(files: Iterable[Path], topic: Optional[str]) -> Iterator[Tuple[Path, bytes, Optional[dict]]]:
+    """(arquivo, bytes crus, JSON) de cada post que passa pelo filtro de tópico"""
+    for path in files:
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            continue
+        data = None
+        if topic:
+            data = json.loads(raw)
+            if not _matches_topic(data, topic):
+                continue
+        yield path, raw, data
+
+
+def iter_ndjson(files: Iterable[Path], topic: Optional[str] = None) -> Iterator[bytes]:
+    """Uma linha JSON compacta por post, com o nome do arquivo em `filename`"""
+    for path, raw, data in _iter_records(files, topic):
+        record = data if data is not None else json.loads(raw)
+        record = {"filename": path.name, **record}
+        yield json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def iter_ndjson_gzip(files: Iterable[Path], topic: Optional[str] = None) -> Iterator[bytes]:
+    """NDJSON comprimido em um único stream gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for line in iter_ndjson(files, topic):
+        chunk = compressor.compress(line)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Destino não-pesquisável para o ZipFile: acumula bytes até serem drenados"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(files: Iterable[Path], topic: Optional[str] = None) -> Iterator[bytes]:
+    """ZIP gerado em fluxo (data descriptors), um arquivo JSON por post"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, raw, _ in _iter_records(files, topic):
+            try:
+                mtime = datetime.fromtimestamp(path.stat().st_mtime)
+            except FileNotFoundError:
+                mtime = datetime(1980, 1, 1)
+            info = zipfile.ZipInfo(path.name, date_time=mtime.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, mode="w") as entry:
+                entry.write(raw)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+
+def iter_export(fmt: str, files: List[Path], topic: Optional[str] = None) -> Iterator[bytes]:
+    if fmt == "zip":
+        return iter_zip(files, topic)
+    if fmt == "ndjson.gz":
+        return iter_ndjson_gzip(files, topic)
+    return iter_ndjson(files, topic)
+
+
+def parse_range(header: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """Interpreta `Range: bytes=start-[end]` (apenas um intervalo)"""
+    if not header:
+        return None
+    match = re.fullmatch(r"\s*bytes=(\d+)-(\d*)\s*", header)
+    if not match:
+        return None
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else None
+    if end is not None and end < start:
+        return None
+    return start, end
+
+
+def stream_length(chunks: Iterable[bytes]) -> int:
+    return sum(len(chunk) for chunk in chunks)
+
+
+def slice_stream(chunks: Iterable[bytes], start: int, end: int) -> Iterator[bytes]:
+    """Repassa apenas os bytes [start, end] (inclusivo) do fluxo"""
+    position = 0
+    for chunk in chunks:
+        chunk_end = position + len(chunk)
+        if chunk_end > start and position <= end:
+            yield chunk[max(start - position, 0):end - position + 1]
+        position = chunk_end
+        if position > end:
+            break
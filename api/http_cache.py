@@ -0,0 +1,116 @@
+"""
+Validadores HTTP (ETag / Last-Modified) e compressão para o Web API
+Permite responder 304 Not Modified sem reler nem reserializar os arquivos
+"""
+
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.middleware.gzip import GZipMiddleware
+
+try:
+    # Opcional: compressão brotli (cai para gzip quando o cliente não aceita br)
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+
+def etag_from_bytes(data: bytes) -> str:
+    """ETag forte calculada sobre o conteúdo"""
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def etag_from_stats(stats: Iterable[os.stat_result], salt: str = "") -> str:
+    """ETag forte calculada sobre tamanho e mtime (ns) de um ou mais arquivos"""
+    digest = hashlib.sha256(salt.encode("utf-8"))
+    for st in stats:
+        digest.update(f"{st.st_size}:{st.st_mtime_ns};".encode("ascii"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def validator_headers(etag: str, last_modified: float, cache_control: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float]) -> bool:
+    """Avalia If-None-Match (prioritário) e If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def conditional_response(
+    request: Request,
+    body: bytes,
+    media_type: str,
+    last_modified: float,
+    cache_control: str = "no-cache",
+    etag: Optional[str] = None,
+) -> Response:
+    """Responde 304 se o cliente já tem a versão atual, senão o corpo com validadores"""
+    headers = validator_headers(etag or etag_from_bytes(body), last_modified, cache_control)
+    if is_not_modified(request, headers["ETag"], last_modified):
+        return not_modified_response(headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def weaken_etag(headers: list) -> list:
+    """Troca um ETag forte por fraco (W/) numa lista de cabeçalhos ASGI"""
+    return [
+        (name, b"W/" + value if name.lower() == b"etag" and not value.startswith(b"W/") else value)
+        for name, value in headers
+    ]
+
+
+class CompressionMiddleware:
+    """Comprime respostas acima de `minimum_size`, exceto nos prefixos excluídos
+
+    Rotas excluídas servem conteúdo já comprimido ou respostas parciais (Range),
+    cujos offsets precisam se referir aos bytes não transformados.
+
+    Nas demais, a mesma ETag serviria a versão identity, gzip e brotli, que
+    não são idênticas byte a byte; por isso ela vira fraca (W/"..."), inclusive
+    nos 304. If-None-Match já usa comparação fraca (is_not_modified).
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, exclude_prefixes: Tuple[str, ...] = ()):
+        self.app = app
+        self.exclude_prefixes = exclude_prefixes
+        if BrotliMiddleware is not None:
+            self.compressed_app = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed_app = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        async def send_weak_etag(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": weaken_etag(message.get("headers", []))}
+            await send(message)
+
+        await self.compressed_app(scope, receive, send_weak_etag)
@@ -3,13 +3,22 @@ Orquestrador MCP - Coordena fluxo entre Agent1 (Ollama) e Agent2 (Gemini)
 Utiliza chamadas HTTP REST para comunicação com os agentes
 """
 
-import httpx
+import argparse
 import asyncio
+import csv
+import hashlib
 import os
 import json
-from typing import Dict
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import logging
+from contextvars import ContextVar
+
+from semantic_cache import SemanticCache, partition_key
+from shared.cassette import request_key, shared_cassette
+from transport import HttpTransport, TransportConnectError, TransportTimeout, with_cassette
 
 # Configurar logging
 logging.basicConfig(
@@ -22,7 +31,22 @@ logger = logging.getLogger(__name__)
 AGENT1_URL = os.getenv("AGENT1_URL", "http://agent1-local:8001")
 AGENT2_URL = os.getenv("AGENT2_URL", "http://agent2-gemini:8002")
 
-HTTP_TIMEOUT = 120.0
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "120"))
+
+# Corpos JSON a partir de AGENT_COMPRESS_MIN_BYTES vão com gzip para os agentes (0 desliga)
+AGENT_COMPRESS_MIN_BYTES = int(os.getenv("AGENT_COMPRESS_MIN_BYTES", "0"))
+
+# Cabeçalhos repassados aos agentes na requisição atual (ex: X-Profile)
+forward_headers: ContextVar[Dict[str, str]] = ContextVar("forward_headers", default={})
+
+# Prazo da requisição (relógio time.monotonic), definido na borda e propagado
+# aos agentes como tempo restante em milissegundos
+DEADLINE_HEADER = "X-Deadline-Ms"
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# Classe de prioridade no Agent 1 (interactive | batch)
+PRIORITY_HEADER = "X-Priority"
+PRIORITY_CLASSES = ("interactive", "batch")
 
 logger.info(f"Conectando a Agent1: {AGENT1_URL}")
 logger.info(f"Conectando a Agent2: {AGENT2_URL}")
@@ -33,63 +57,259 @@ class OrchestratorError(Exception):
     pass
 
 
+class AgentTimeoutError(OrchestratorError):
+    """Um agente não respondeu dentro do tempo limite"""
+    pass
+
+
+class AgentConnectionError(OrchestratorError):
+    """Não foi possível conectar a um agente"""
+    pass
+
+
+class DeadlineExceededError(AgentTimeoutError):
+    """O prazo da requisição acabou antes de uma etapa começar"""
+    pass
+
+
+class StageLatency:
+    """Latências recentes por etapa; o timeout padrão vem do percentil observado
+
+    Até juntar `min_samples` medições a etapa usa o timeout configurado no
+    cliente. Depois disso usa `multiplier` x p99, limitado a [floor, timeout
+    configurado].
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, multiplier: float = 2.0, floor: float = 5.0):
+        self.window = window
+        self.min_samples = min_samples
+        self.multiplier = multiplier
+        self.floor = floor
+        self._samples: Dict[str, deque] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, stage: str, pct: float) -> Optional[float]:
+        samples = sorted(self._samples.get(stage, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))]
+
+    def timeout_for(self, stage: str, default: float) -> float:
+        if len(self._samples.get(stage, ())) < self.min_samples:
+            return default
+        return min(default, max(self.floor, self.percentile(stage, 99) * self.multiplier))
+
+    def snapshot(self, default: float = HTTP_TIMEOUT) -> Dict[str, Dict]:
+        return {
+            stage: {
+                "samples": len(samples),
+                "p50": round(self.percentile(stage, 50), 3),
+                "p95": round(self.percentile(stage, 95), 3),
+                "p99": round(self.percentile(stage, 99), 3),
+                "timeout": round(self.timeout_for(stage, default), 3),
+            }
+            for stage, samples in self._samples.items()
+        }
+
+
+stage_latency = StageLatency(
+    min_samples=int(os.getenv("ADAPTIVE_TIMEOUT_MIN_SAMPLES", "20")),
+    multiplier=float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "2.0")),
+)
+
+
+def _call_budget(stage: str, default_timeout: float) -> Tuple[float, Dict[str, str]]:
+    """Timeout e cabeçalhos de uma chamada: o menor entre o adaptativo e o prazo restante"""
+    timeout = stage_latency.timeout_for(stage, default_timeout)
+    deadline = request_deadline.get()
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"Prazo da requisição esgotado antes da etapa {stage}")
+        timeout = min(timeout, remaining)
+    # O agente recebe o mesmo prazo que o orquestrador vai esperar por ele
+    return timeout, {**forward_headers.get(), DEADLINE_HEADER: str(int(timeout * 1000))}
+
+
+def stage_key(stage: str, **inputs) -> str:
+    """Chave de memoização de uma etapa: hash exato das entradas de que ela depende"""
+    canonical = json.dumps({"stage": stage, **inputs}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class TokenUsage:
+    """Acumula os tokens consumidos por etapa de um workflow e controla o orçamento"""
+    
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget
+        self.stages: Dict[str, Dict[str, int]] = {}
+        self.skipped_stages: List[str] = []
+    
+    def add(self, stage: str, usage: Optional[Dict]) -> None:
+        if not usage:
+            return
+        totals = self.stages.setdefault(
+            stage, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        )
+        for key in totals:
+            totals[key] += int(usage.get(key, 0) or 0)
+    
+    @property
+    def total_tokens(self) -> int:
+        return sum(stage["total_tokens"] for stage in self.stages.values())
+    
+    @property
+    def exceeded(self) -> bool:
+        return self.budget is not None and self.total_tokens > self.budget
+    
+    def to_dict(self) -> Dict:
+        return {
+            "stages": self.stages,
+            "prompt_tokens": sum(s["prompt_tokens"] for s in self.stages.values()),
+            "completion_tokens": sum(s["completion_tokens"] for s in self.stages.values()),
+            "total_tokens": self.total_tokens,
+            "budget": self.budget,
+            "budget_exceeded": self.exceeded,
+            "skipped_stages": self.skipped_stages
+        }
+
+
 class Agent1Client:
     """Cliente para Agent1 (Ollama Local)"""
     
-    def __init__(self, base_url: str = AGENT1_URL, timeout: float = HTTP_TIMEOUT):
+    def __init__(
+        self, base_url: str = AGENT1_URL, timeout: float = HTTP_TIMEOUT, transport=None
+    ):
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
+        # HttpTransport por padrão; InProcessTransport no modo monólito;
+        # gravado/reproduzido em cassete com CASSETTE_MODE=record|replay
+        self.transport = with_cassette("agent1", transport or HttpTransport(
+            self.base_url, compress_min_bytes=AGENT_COMPRESS_MIN_BYTES
+        ))
+    
+    async def aclose(self) -> None:
+        """Fecha o pool de conexões do transporte"""
+        await self.transport.aclose()
     
     async def health_check(self) -> bool:
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/")
-                is_healthy = response.status_code == 200
-                if is_healthy:
-                    logger.info(f"✅ Agent1 está respondendo")
-                return is_healthy
+            response = await self.transport.get("/", timeout=5.0)
+            # O agente responde "starting" enquanto carrega modelos em segundo plano
+            is_healthy = (
+                response.status_code == 200
+                and response.json().get("status") not in ("starting", "error")
+            )
+            if is_healthy:
+                logger.info(f"✅ Agent1 está respondendo")
+            return is_healthy
         except Exception as e:
             logger.debug(f"Agent1 ainda não pronto: {e}")
             return False
     
-    async def generate_draft(self, topic: str, style: str, tone: str = "criativo") -> str:
+    async def generate_draft(
+        self, topic: str, style: str, tone: str = "criativo", usage: Optional[TokenUsage] = None
+    ) -> str:
         try:
             logger.info(f"📝 Agent1: Gerando rascunho - Tópico: {topic}, Estilo: {style}")
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                payload = {"topic": topic, "style": style, "tone": tone}
-                
-                response = await client.post(
-                    f"{self.base_url}/api/tools/generate_draft",
-                    json=payload
+            timeout, headers = _call_budget("draft", self.timeout)
+            started = time.perf_counter()
+            payload = {"topic": topic, "style": style, "tone": tone}
+            
+            response = await self.transport.post(
+                "/api/tools/generate_draft", payload, timeout=timeout, headers=headers
+            )
+            
+            if response.status_code == 504:
+                raise AgentTimeoutError("Agent1 esgotou o prazo da requisição")
+            if response.status_code != 200:
+                raise OrchestratorError(
+                    f"Agent1 retornou status {response.status_code}: {response.text}"
                 )
-                
-                if response.status_code != 200:
-                    raise OrchestratorError(
-                        f"Agent1 retornou status {response.status_code}: {response.text}"
-                    )
-                
-                result = response.json()
-                
-                if isinstance(result, dict) and "content" in result:
-                    content = result["content"]
-                    if isinstance(content, list) and len(content) > 0:
-                        draft_text = content[0].get("text", "")
-                    else:
-                        draft_text = content.get("text", "") if isinstance(content, dict) else str(content)
+            
+            stage_latency.observe("draft", time.perf_counter() - started)
+            result = response.json()
+            if usage is not None and isinstance(result, dict):
+                usage.add("draft", result.get("usage"))
+            
+            if isinstance(result, dict) and "content" in result:
+                content = result["content"]
+                if isinstance(content, list) and len(content) > 0:
+                    draft_text = content[0].get("text", "")
                 else:
-                    draft_text = str(result)
-                
-                if not draft_text or len(draft_text) < 10:
-                    raise OrchestratorError("Agent1 retornou rascunho vazio")
-                
-                logger.info(f"✅ Rascunho gerado com sucesso ({len(draft_text)} caracteres)")
-                return draft_text.strip()
+                    draft_text = content.get("text", "") if isinstance(content, dict) else str(content)
+            else:
+                draft_text = str(result)
+            
+            if not draft_text or len(draft_text) < 10:
+                raise OrchestratorError("Agent1 retornou rascunho vazio")
+            
+            logger.info(f"✅ Rascunho gerado com sucesso ({len(draft_text)} caracteres)")
+            return draft_text.strip()
         
-        except httpx.TimeoutException:
-            raise OrchestratorError(f"Agent1 timeout após {self.timeout}s")
-        except httpx.ConnectError as e:
-            raise OrchestratorError(f"Não conseguiu conectar a Agent1: {e}")
+        except OrchestratorError:
+            raise
+        except TransportTimeout:
+            # Conta como amostra (limite inferior) para o timeout não encolher indefinidamente
+            stage_latency.observe("draft", time.perf_counter() - started)
+            raise AgentTimeoutError(f"Agent1 timeout após {timeout:.1f}s")
+        except TransportConnectError as e:
+            raise AgentConnectionError(f"Não conseguiu conectar a Agent1: {e}")
+        except Exception as e:
+            raise OrchestratorError(f"Erro ao chamar Agent1: {str(e)}")
+    
+    async def generate_drafts(
+        self, topic: str, style: str, tone: str = "criativo", variants: int = 2,
+        usage: Optional[TokenUsage] = None
+    ) -> List[str]:
+        """Gera várias variantes de rascunho em uma única requisição ao Agent1"""
+        try:
+            logger.info(f"📝 Agent1: Gerando {variants} rascunhos - Tópico: {topic}, Estilo: {style}")
+            
+            timeout, headers = _call_budget("draft_variants", self.timeout)
+            started = time.perf_counter()
+            payload = {"topic": topic, "style": style, "tone": tone, "variants": variants}
+            
+            response = await self.transport.post(
+                "/api/tools/generate_draft", payload, timeout=timeout, headers=headers
+            )
+            
+            if response.status_code == 504:
+                raise AgentTimeoutError("Agent1 esgotou o prazo da requisição")
+            if response.status_code != 200:
+                raise OrchestratorError(
+                    f"Agent1 retornou status {response.status_code}: {response.text}"
+                )
+            
+            stage_latency.observe("draft_variants", time.perf_counter() - started)
+            result = response.json()
+            if usage is not None:
+                usage.add("draft", result.get("usage"))
+            
+            content = result.get("content", [])
+            drafts = [
+                item.get("text", "").strip()
+                for item in content
+                if isinstance(item, dict)
+            ]
+            drafts = [d for d in drafts if len(d) >= 10 and not d.startswith("Erro")]
+            
+            if not drafts:
+                raise OrchestratorError("Agent1 não retornou nenhum rascunho válido")
+            
+            logger.info(f"✅ {len(drafts)}/{variants} rascunhos gerados com sucesso")
+            return drafts
+        
+        except OrchestratorError:
+            raise
+        except TransportTimeout:
+            stage_latency.observe("draft_variants", time.perf_counter() - started)
+            raise AgentTimeoutError(f"Agent1 timeout após {timeout:.1f}s")
+        except TransportConnectError as e:
+            raise AgentConnectionError(f"Não conseguiu conectar a Agent1: {e}")
         except Exception as e:
             raise OrchestratorError(f"Erro ao chamar Agent1: {str(e)}")
 
@@ -97,99 +317,187 @@ class Agent1Client:
 class Agent2Client:
     """Cliente para Agent2 (Gemini Cloud)"""
     
-    def __init__(self, base_url: str = AGENT2_URL, timeout: float = HTTP_TIMEOUT):
+    def __init__(
+        self, base_url: str = AGENT2_URL, timeout: float = HTTP_TIMEOUT, transport=None
+    ):
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
+        # HttpTransport por padrão; InProcessTransport no modo monólito;
+        # gravado/reproduzido em cassete com CASSETTE_MODE=record|replay
+        self.transport = with_cassette("agent2", transport or HttpTransport(
+            self.base_url, compress_min_bytes=AGENT_COMPRESS_MIN_BYTES
+        ))
+    
+    async def aclose(self) -> None:
+        """Fecha o pool de conexões do transporte"""
+        await self.transport.aclose()
     
     async def health_check(self) -> bool:
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.base_url}/")
-                is_healthy = response.status_code == 200
-                if is_healthy:
-                    logger.info(f"✅ Agent2 está respondendo")
-                return is_healthy
+            response = await self.transport.get("/", timeout=5.0)
+            # O agente responde "starting" enquanto carrega modelos em segundo plano
+            is_healthy = (
+                response.status_code == 200
+                and response.json().get("status") not in ("starting", "error")
+            )
+            if is_healthy:
+                logger.info(f"✅ Agent2 está respondendo")
+            return is_healthy
         except Exception as e:
             logger.debug(f"Agent2 ainda não pronto: {e}")
             return False
     
-    async def improve_content(self, draft_text: str, target_audience: str = "público geral") -> str:
+    async def improve_content(
+        self, draft_text: str, target_audience: str = "público geral", usage: Optional[TokenUsage] = None
+    ) -> str:
         """Chama o endpoint /improve do Agent2"""
         try:
             logger.info(f"✨ Agent2: Refinando conteúdo para {target_audience}")
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                # ✅ IMPORTANTE: Usar /improve em vez de /api/tools/improve_content
-                payload = {
-                    "draft_text": draft_text,
-                    "target_audience": target_audience
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/improve",  # ✅ ENDPOINT CORRETO
-                    json=payload
+            timeout, headers = _call_budget("improve", self.timeout)
+            started = time.perf_counter()
+            # ✅ IMPORTANTE: Usar /improve em vez de /api/tools/improve_content
+            payload = {
+                "draft_text": draft_text,
+                "target_audience": target_audience
+            }
+            
+            response = await self.transport.post(
+                "/improve", payload, timeout=timeout, headers=headers
+            )
+            
+            if response.status_code == 504:
+                raise AgentTimeoutError("Agent2 esgotou o prazo da requisição")
+            if response.status_code != 200:
+                raise OrchestratorError(
+                    f"Agent2 retornou status {response.status_code}: {response.text}"
                 )
-                
-                if response.status_code != 200:
-                    raise OrchestratorError(
-                        f"Agent2 retornou status {response.status_code}: {response.text}"
-                    )
-                
-                result = response.json()
-                
-                # Agent2 retorna improved_text diretamente
-                improved_text = result.get("improved_text", "")
-                
-                if not improved_text or len(improved_text) < 10:
-                    raise OrchestratorError("Agent2 retornou conteúdo vazio")
-                
-                logger.info(f"✅ Conteúdo refinado com sucesso ({len(improved_text)} caracteres)")
-                return improved_text.strip()
+            
+            stage_latency.observe("improve", time.perf_counter() - started)
+            result = response.json()
+            if usage is not None:
+                usage.add("improve", result.get("usage"))
+            
+            # Agent2 retorna improved_text diretamente
+            improved_text = result.get("improved_text", "")
+            
+            if not improved_text or len(improved_text) < 10:
+                raise OrchestratorError("Agent2 retornou conteúdo vazio")
+            
+            logger.info(f"✅ Conteúdo refinado com sucesso ({len(improved_text)} caracteres)")
+            return improved_text.strip()
         
-        except httpx.TimeoutException:
-            raise OrchestratorError(f"Agent2 timeout após {self.timeout}s")
-        except httpx.ConnectError as e:
-            raise OrchestratorError(f"Não conseguiu conectar a Agent2: {e}")
+        except OrchestratorError:
+            raise
+        except TransportTimeout:
+            stage_latency.observe("improve", time.perf_counter() - started)
+            raise AgentTimeoutError(f"Agent2 timeout após {timeout:.1f}s")
+        except TransportConnectError as e:
+            raise AgentConnectionError(f"Não conseguiu conectar a Agent2: {e}")
         except Exception as e:
             raise OrchestratorError(f"Erro ao chamar Agent2 improve_content: {str(e)}")
     
-    async def generate_image_prompt(self, post_text: str) -> str:
-        """Chama o endpoint /generate-image do Agent2"""
+    async def improve_variants(
+        self, drafts: List[str], target_audience: str = "público geral", usage: Optional[TokenUsage] = None
+    ) -> Dict:
+        """Chama o endpoint /improve-variants do Agent2 (uma única chamada ao Gemini)"""
+        try:
+            logger.info(f"✨ Agent2: Refinando e ranqueando {len(drafts)} variantes para {target_audience}")
+            
+            timeout, headers = _call_budget("improve_variants", self.timeout)
+            started = time.perf_counter()
+            payload = {
+                "drafts": drafts,
+                "target_audience": target_audience
+            }
+            
+            response = await self.transport.post(
+                "/improve-variants", payload, timeout=timeout, headers=headers
+            )
+            
+            if response.status_code == 504:
+                raise AgentTimeoutError("Agent2 esgotou o prazo da requisição")
+            if response.status_code != 200:
+                raise OrchestratorError(
+                    f"Agent2 retornou status {response.status_code}: {response.text}"
+                )
+            
+            stage_latency.observe("improve_variants", time.perf_counter() - started)
+            result = response.json()
+            if usage is not None:
+                usage.add("improve", result.get("usage"))
+            best = result.get("best") or {}
+            
+            if len(best.get("improved_text", "")) < 10:
+                raise OrchestratorError("Agent2 retornou conteúdo vazio")
+            
+            logger.info(f"✅ Variantes ranqueadas (melhor: #{best.get('index')}, nota {best.get('score')})")
+            return {
+                "best": best,
+                "alternatives": result.get("alternatives", [])
+            }
+        
+        except OrchestratorError:
+            raise
+        except TransportTimeout:
+            stage_latency.observe("improve_variants", time.perf_counter() - started)
+            raise AgentTimeoutError(f"Agent2 timeout após {timeout:.1f}s")
+        except TransportConnectError as e:
+            raise AgentConnectionError(f"Não conseguiu conectar a Agent2: {e}")
+        except Exception as e:
+            raise OrchestratorError(f"Erro ao chamar Agent2 improve_variants: {str(e)}")
+    
+    async def generate_image_prompt(
+        self, post_text: str, style: str = "realistic", usage: Optional[TokenUsage] = None
+    ) -> Tuple[str, Optional[str]]:
+        """Chama o endpoint /generate-image do Agent2
+
+        Retorna a descrição e o `prompt_hash` calculado pelo Agent2 (a chave
+        de /image-prompts/{hash}; não é recalculado aqui para não divergir).
+        """
         try:
             logger.info("🎨 Agent2: Gerando prompt de imagem")
             
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                # ✅ IMPORTANTE: Usar /generate-image em vez de /api/tools/generate_image_prompt
-                payload = {
-                    "prompt": post_text,
-                    "style": "realistic"
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/generate-image",  # ✅ ENDPOINT CORRETO
-                    json=payload
+            timeout, headers = _call_budget("image", self.timeout)
+            started = time.perf_counter()
+            # ✅ IMPORTANTE: Usar /generate-image em vez de /api/tools/generate_image_prompt
+            payload = {
+                "prompt": post_text,
+                "style": style
+            }
+            
+            response = await self.transport.post(
+                "/generate-image", payload, timeout=timeout, headers=headers
+            )
+            
+            if response.status_code == 504:
+                raise AgentTimeoutError("Agent2 esgotou o prazo da requisição")
+            if response.status_code != 200:
+                raise OrchestratorError(
+                    f"Agent2 retornou status {response.status_code}: {response.text}"
                 )
-                
-                if response.status_code != 200:
-                    raise OrchestratorError(
-                        f"Agent2 retornou status {response.status_code}: {response.text}"
-                    )
-                
-                result = response.json()
-                
-                # Agent2 retorna image_path com descrição
-                image_prompt = result.get("image_path", "")
-                
-                if not image_prompt or len(image_prompt) < 5:
-                    raise OrchestratorError("Agent2 retornou prompt vazio")
-                
-                logger.info(f"✅ Prompt de imagem gerado com sucesso")
-                return image_prompt.strip()
+            
+            stage_latency.observe("image", time.perf_counter() - started)
+            result = response.json()
+            if usage is not None:
+                usage.add("image", result.get("usage"))
+            
+            # Agent2 retorna a descrição inline (e o hash de conteúdo)
+            image_prompt = result.get("image_prompt", "")
+            
+            if not image_prompt or len(image_prompt) < 5:
+                raise OrchestratorError("Agent2 retornou prompt vazio")
+            
+            logger.info(f"✅ Prompt de imagem gerado com sucesso")
+            return image_prompt.strip(), result.get("prompt_hash")
         
-        except httpx.TimeoutException:
-            raise OrchestratorError(f"Agent2 timeout ao gerar prompt")
-        except httpx.ConnectError as e:
-            raise OrchestratorError(f"Não conseguiu conectar a Agent2: {e}")
+        except OrchestratorError:
+            raise
+        except TransportTimeout:
+            stage_latency.observe("image", time.perf_counter() - started)
+            raise AgentTimeoutError(f"Agent2 timeout ao gerar prompt")
+        except TransportConnectError as e:
+            raise AgentConnectionError(f"Não conseguiu conectar a Agent2: {e}")
         except Exception as e:
             raise OrchestratorError(f"Erro ao chamar Agent2: {str(e)}")
 
@@ -197,9 +505,26 @@ class Agent2Client:
 class Orchestrator:
     """Orquestrador principal"""
     
-    def __init__(self, agent1_url: str = AGENT1_URL, agent2_url: str = AGENT2_URL):
-        self.agent1 = Agent1Client(agent1_url)
-        self.agent2 = Agent2Client(agent2_url)
+    def __init__(
+        self,
+        agent1_url: str = AGENT1_URL,
+        agent2_url: str = AGENT2_URL,
+        cache: Optional[SemanticCache] = None,
+        refine_on_hit: bool = False,
+        agent1_transport=None,
+        agent2_transport=None
+    ):
+        self.agent1 = Agent1Client(agent1_url, transport=agent1_transport)
+        self.agent2 = Agent2Client(agent2_url, transport=agent2_transport)
+        self.cache = cache
+        self.refine_on_hit = refine_on_hit
+        # Amostra de tráfego para `benchmark.py replay` (CASSETTE_MODE=record)
+        self.workflow_cassette = shared_cassette("workflows")
+    
+    async def aclose(self) -> None:
+        """Fecha as conexões com os agentes (no shutdown da aplicação)"""
+        await self.agent1.aclose()
+        await self.agent2.aclose()
     
     async def verify_agents_health(self, retries: int = 30, delay: int = 2) -> bool:
         logger.info(f"🔍 Verificando saúde dos agentes (máximo {retries} tentativas)...")
@@ -219,12 +544,177 @@ class Orchestrator:
         logger.error(f"❌ Agentes não responderam após {retries} tentativas")
         return False
     
+    @staticmethod
+    def _budget_exceeded(usage: TokenUsage, *remaining_stages: str) -> bool:
+        """Se o orçamento de tokens estourou, marca as etapas restantes como puladas
+
+        Avisa uma única vez por requisição: a primeira chamada após o estouro
+        já lista todas as etapas restantes.
+        """
+        if not usage.exceeded:
+            return False
+        newly_skipped = [stage for stage in remaining_stages if stage not in usage.skipped_stages]
+        if newly_skipped:
+            usage.skipped_stages.extend(newly_skipped)
+            logger.warning(
+                f"⚠️ Orçamento de {usage.budget} tokens excedido ({usage.total_tokens}); "
+                f"pulando etapa(s): {', '.join(newly_skipped)}"
+            )
+        return True
+    
     async def run_instagram_workflow(
         self,
         topic: str,
         style: str,
         tone: str = "criativo",
-        target_audience: str = "público geral"
+        target_audience: str = "público geral",
+        variants: int = 1,
+        token_budget: Optional[int] = None,
+        image_style: str = "realistic"
+    ) -> Dict:
+        """Executa o workflow, consultando antes o cache semântico (se houver)
+
+        Com CASSETTE_MODE=record, as entradas, o post final e a latência de
+        cada workflow vão para o cassete `workflows`.
+        """
+        inputs = dict(
+            topic=topic, style=style, tone=tone, target_audience=target_audience,
+            variants=variants, token_budget=token_budget, image_style=image_style
+        )
+        if self.workflow_cassette is None or self.workflow_cassette.mode != "record":
+            return await self._run_workflow(**inputs)
+        
+        start = time.perf_counter()
+        result = await self._run_workflow(**inputs)
+        self.workflow_cassette.record(
+            request_key("workflow", inputs), inputs,
+            {"final_post": result["final_post"], "usage": result["metadata"].get("usage")},
+            time.perf_counter() - start
+        )
+        return result
+    
+    async def _run_workflow(
+        self,
+        topic: str,
+        style: str,
+        tone: str,
+        target_audience: str,
+        variants: int,
+        token_budget: Optional[int],
+        image_style: str
+    ) -> Dict:
+        partition = f"{partition_key(style, tone, target_audience, variants)}|{image_style}"
+        if self.cache is not None:
+            try:
+                cached = await asyncio.to_thread(self.cache.lookup, topic, partition)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao consultar cache semântico: {e}")
+                cached = None
+            if cached is not None:
+                return await self._serve_cached(cached, topic, target_audience, token_budget)
+        
+        result = await self._execute_workflow(
+            topic=topic,
+            style=style,
+            tone=tone,
+            target_audience=target_audience,
+            variants=variants,
+            token_budget=token_budget,
+            image_style=image_style
+        )
+        
+        # Posts incompletos (orçamento estourado) não entram no cache
+        if self.cache is not None and not result["metadata"]["usage"]["skipped_stages"]:
+            try:
+                await asyncio.to_thread(self.cache.store, topic, partition, result)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao gravar no cache semântico: {e}")
+        return result
+    
+    async def regenerate(
+        self,
+        previous: Dict,
+        token_budget: Optional[int] = None,
+        source: Optional[str] = None,
+        **overrides
+    ) -> Dict:
+        """Refaz um post do histórico com parâmetros alterados
+
+        Só as etapas cujas entradas mudaram são executadas; as demais reutilizam
+        as saídas de `previous` (comparando as chaves em metadata.stages).
+        """
+        metadata = previous.get("metadata", {})
+        params = {
+            "topic": metadata.get("topic"),
+            "style": metadata.get("style"),
+            "tone": metadata.get("tone", "criativo"),
+            "target_audience": metadata.get("target_audience", "público geral"),
+            "variants": metadata.get("variants", 1),
+            "image_style": metadata.get("image_style", "realistic"),
+        }
+        params.update({key: value for key, value in overrides.items() if value is not None})
+        if not params["topic"] or not params["style"]:
+            raise OrchestratorError("Post de origem sem tópico ou estilo")
+        result = await self._execute_workflow(**params, token_budget=token_budget, previous=previous)
+        result["metadata"]["regenerated_from"] = source
+        return result
+    
+    async def _serve_cached(
+        self, cached: tuple, topic: str, target_audience: str, token_budget: Optional[int]
+    ) -> Dict:
+        """Devolve um post do cache semântico, opcionalmente re-refinado pelo Agent2"""
+        result, similarity = cached
+        source_topic = result["metadata"]["topic"]
+        logger.info(f"🧠 Cache semântico: '{topic}' ≈ '{source_topic}' (similaridade {similarity:.3f})")
+        
+        usage = TokenUsage(budget=token_budget)
+        stages = result["metadata"].get("stages", {})
+        if self.refine_on_hit:
+            # Refino leve: só a etapa de Gemini sobre o rascunho já existente
+            result["final_post"] = await self.agent2.improve_content(
+                draft_text=result["draft"],
+                target_audience=target_audience,
+                usage=usage
+            )
+            # O post mudou: a descrição da imagem é refeita a partir dele (se o
+            # orçamento permitir), as alternativas do ranking original são
+            # descartadas e as chaves de etapa, que descrevem o post de origem,
+            # não são reaproveitadas por um regenerate
+            image_prompt, image_prompt_hash = "", None
+            if not self._budget_exceeded(usage, "image"):
+                image_prompt, image_prompt_hash = await self.agent2.generate_image_prompt(
+                    post_text=result["final_post"],
+                    style=result["metadata"].get("image_style", "realistic"),
+                    usage=usage
+                )
+            result.update(image_prompt=image_prompt, image_prompt_hash=image_prompt_hash, alternatives=[])
+            stages = {}
+        
+        result["timestamp"] = datetime.now().isoformat()
+        result["metadata"] = {
+            **result["metadata"],
+            "topic": topic,
+            "stages": stages,
+            "usage": usage.to_dict(),
+            "cache": {
+                "hit": True,
+                "similarity": round(similarity, 4),
+                "source_topic": source_topic,
+                "refined": self.refine_on_hit
+            }
+        }
+        return result
+    
+    async def _execute_workflow(
+        self,
+        topic: str,
+        style: str,
+        tone: str = "criativo",
+        target_audience: str = "público geral",
+        variants: int = 1,
+        token_budget: Optional[int] = None,
+        image_style: str = "realistic",
+        previous: Optional[Dict] = None
     ) -> Dict:
         try:
             timestamp = datetime.now().isoformat()
@@ -234,39 +724,116 @@ class Orchestrator:
             logger.info(f"   Estilo: {style}")
             logger.info(f"   Tom: {tone}")
             logger.info(f"   Público: {target_audience}")
+            logger.info(f"   Variantes: {variants}")
+            logger.info(f"   Estilo da imagem: {image_style}")
+            if token_budget is not None:
+                logger.info(f"   Orçamento: {token_budget} tokens")
             logger.info(f"{'='*70}\n")
             
-            # ETAPA 1: Gerar rascunho com Agent1
-            logger.info("ETAPA 1/3: Gerando rascunho inicial...")
-            draft = await self.agent1.generate_draft(topic=topic, style=style, tone=tone)
-            logger.info(f"\n📝 RASCUNHO:\n{'-'*70}\n{draft}\n{'-'*70}\n")
+            usage = TokenUsage(budget=token_budget)
+            # Saídas reaproveitáveis de uma execução anterior (regenerate)
+            previous_stages = (previous or {}).get("metadata", {}).get("stages", {})
+            stages, reused = {}, []
             
-            # ETAPA 2: Melhorar conteúdo com Agent2
-            logger.info("ETAPA 2/3: Refinando conteúdo com Gemini...")
-            final_post = await self.agent2.improve_content(
-                draft_text=draft,
-                target_audience=target_audience
-            )
+            def is_reusable(stage: str, key: str) -> bool:
+                if previous_stages.get(stage, {}).get("key") != key:
+                    return False
+                logger.info(f"♻️ Etapa {stage} reaproveitada (entradas inalteradas)")
+                reused.append(stage)
+                return True
+            
+            # ETAPA 1: Rascunho(s) com Agent1 (N variantes em uma requisição)
+            draft_key = stage_key("draft", topic=topic, style=style, tone=tone, variants=variants)
+            if is_reusable("draft", draft_key):
+                drafts = previous_stages["draft"]["drafts"]
+            elif variants > 1:
+                logger.info(f"ETAPA 1/3: Gerando {variants} rascunhos...")
+                drafts = await self.agent1.generate_drafts(
+                    topic=topic, style=style, tone=tone, variants=variants, usage=usage
+                )
+            else:
+                logger.info("ETAPA 1/3: Gerando rascunho inicial...")
+                drafts = [await self.agent1.generate_draft(
+                    topic=topic, style=style, tone=tone, usage=usage
+                )]
+            stages["draft"] = {"key": draft_key, "drafts": drafts}
+            draft = final_post = drafts[0]
+            alternatives = []
+            
+            # ETAPA 2: Refinar com Agent2 (com variantes, refina e ranqueia em uma chamada)
+            if not self._budget_exceeded(usage, "improve", "image"):
+                improve_key = stage_key("improve", drafts=drafts, target_audience=target_audience)
+                if is_reusable("improve", improve_key):
+                    draft = previous["draft"]
+                    final_post = previous["final_post"]
+                    alternatives = previous.get("alternatives", [])
+                elif variants > 1:
+                    logger.info("ETAPA 2/3: Refinando e ranqueando variantes com Gemini...")
+                    ranking = await self.agent2.improve_variants(
+                        drafts=drafts,
+                        target_audience=target_audience,
+                        usage=usage
+                    )
+                    best = ranking["best"]
+                    draft = drafts[best["index"]]
+                    final_post = best["improved_text"].strip()
+                    alternatives = [
+                        {
+                            "draft": drafts[alt["index"]],
+                            "final_post": alt["improved_text"],
+                            "hashtags": alt.get("hashtags", []),
+                            "score": alt.get("score")
+                        }
+                        for alt in ranking["alternatives"]
+                    ]
+                else:
+                    logger.info("ETAPA 2/3: Refinando conteúdo com Gemini...")
+                    final_post = await self.agent2.improve_content(
+                        draft_text=draft,
+                        target_audience=target_audience,
+                        usage=usage
+                    )
+                stages["improve"] = {"key": improve_key}
+            logger.info(f"\n📝 RASCUNHO:\n{'-'*70}\n{draft}\n{'-'*70}\n")
             logger.info(f"\n✨ POST FINAL:\n{'-'*70}\n{final_post}\n{'-'*70}\n")
             
             # ETAPA 3: Gerar prompt de imagem
-            logger.info("ETAPA 3/3: Gerando prompt de imagem...")
-            image_prompt = await self.agent2.generate_image_prompt(post_text=final_post)
-            logger.info(f"\n🎨 PROMPT DE IMAGEM:\n{'-'*70}\n{image_prompt}\n{'-'*70}\n")
+            image_prompt, image_prompt_hash = "", None
+            if not self._budget_exceeded(usage, "image"):
+                image_key = stage_key("image", final_post=final_post, image_style=image_style)
+                if is_reusable("image", image_key):
+                    image_prompt = previous["image_prompt"]
+                    image_prompt_hash = previous.get("image_prompt_hash")
+                else:
+                    logger.info("ETAPA 3/3: Gerando prompt de imagem...")
+                    image_prompt, image_prompt_hash = await self.agent2.generate_image_prompt(
+                        post_text=final_post, style=image_style, usage=usage
+                    )
+                    logger.info(f"\n🎨 PROMPT DE IMAGEM:\n{'-'*70}\n{image_prompt}\n{'-'*70}\n")
+                stages["image"] = {"key": image_key}
             
             result = {
                 "draft": draft,
                 "final_post": final_post,
                 "image_prompt": image_prompt,
+                "image_prompt_hash": image_prompt_hash,
+                "alternatives": alternatives,
                 "timestamp": timestamp,
                 "metadata": {
                     "topic": topic,
                     "style": style,
                     "tone": tone,
-                    "target_audience": target_audience
+                    "target_audience": target_audience,
+                    "variants": variants,
+                    "image_style": image_style,
+                    "usage": usage.to_dict(),
+                    "stages": stages
                 }
             }
+            if previous is not None:
+                result["metadata"]["reused_stages"] = reused
             
+            logger.info(f"🔢 Tokens consumidos: {usage.total_tokens}")
             logger.info(f"{'='*70}")
             logger.info("✅ WORKFLOW CONCLUÍDO COM SUCESSO!")
             logger.info(f"{'='*70}\n")
@@ -281,14 +848,210 @@ class Orchestrator:
             raise OrchestratorError(f"Erro inesperado: {str(e)}")
 
 
-async def main():
+# ============= MODO BATCH =============
+
+def iter_batch_items(path: str, defaults: Dict[str, str]):
+    """Lê tópicos em fluxo de um CSV (coluna topic) ou JSONL (objeto ou string por linha)
+
+    Colunas/campos opcionais: style, tone, target_audience; ausentes usam `defaults`.
+    Gera (input_index, item) na ordem do arquivo.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for index, row in enumerate(rows):
+            if isinstance(row, str):
+                row = {"topic": row}
+            topic = (row.get("topic") or "").strip()
+            yield index, {
+                "topic": topic,
+                "style": row.get("style") or defaults["style"],
+                "tone": row.get("tone") or defaults["tone"],
+                "target_audience": row.get("target_audience") or defaults["target_audience"],
+            }
+
+
+def load_completed_indexes(output_path: str) -> set:
+    """Índices já presentes no NDJSON de saída (checkpoint para retomar), gerados ou pulados
+
+    Uma última linha incompleta (processo morto no meio da escrita) é truncada.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "rb+") as f:
+        valid_end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                completed.add(json.loads(line)["input_index"])
+            except (ValueError, KeyError):
+                break
+            valid_end += len(line)
+        f.truncate(valid_end)
+    return completed
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+async def run_batch(
+    orchestrator: Orchestrator,
+    input_path: str,
+    output_path: str,
+    errors_path: str,
+    defaults: Dict[str, str],
+    concurrency: int = 4,
+    variants: int = 1,
+    token_budget: Optional[int] = None,
+    retries: int = 2,
+    progress_interval: float = 10.0
+) -> Dict[str, int]:
+    """Processa um arquivo de tópicos com concorrência limitada, retomando de onde parou"""
+    completed = load_completed_indexes(output_path)
+    total = sum(1 for _ in iter_batch_items(input_path, defaults))
+    pending_total = total - len(completed)
+    logger.info(
+        f"📚 Batch: {total} tópico(s), {len(completed)} já concluído(s), "
+        f"{pending_total} a processar com concorrência {concurrency}"
+    )
+
+    # Lote não deve atrasar pedidos interativos no Agent 1
+    forward_headers.set({**forward_headers.get(), PRIORITY_HEADER: "batch"})
+
+    counters = {"done": 0, "failed": 0, "skipped": 0}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as output, \
+            open(errors_path, "a", encoding="utf-8") as errors:
+
+        def append(target, record: Dict) -> None:
+            target.write(json.dumps(record, ensure_ascii=False) + "\n")
+            target.flush()
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    queue.task_done()
+                    return
+                index, params = item
+                try:
+                    for attempt in range(retries + 1):
+                        try:
+                            result = await orchestrator.run_instagram_workflow(
+                                **params, variants=variants, token_budget=token_budget
+                            )
+                            break
+                        except (AgentTimeoutError, AgentConnectionError):
+                            if attempt == retries:
+                                raise
+                            await asyncio.sleep(2 ** attempt)
+                    append(output, {"input_index": index, **result})
+                    counters["done"] += 1
+                except Exception as e:
+                    append(errors, {
+                        "input_index": index, **params, "error": str(e),
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    counters["failed"] += 1
+                finally:
+                    queue.task_done()
+
+        async def report():
+            while True:
+                await asyncio.sleep(progress_interval)
+                processed = counters["done"] + counters["failed"] + counters["skipped"]
+                elapsed = time.perf_counter() - started
+                rate = processed / elapsed if elapsed else 0.0
+                eta = _format_eta((pending_total - processed) / rate) if rate else "?"
+                logger.info(
+                    f"📊 {len(completed) + counters['done'] + counters['skipped']}/{total} concluído(s), "
+                    f"{counters['failed']} erro(s) | {rate:.2f} tópicos/s | ETA {eta}"
+                )
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        reporter = asyncio.create_task(report())
+        try:
+            for index, params in iter_batch_items(input_path, defaults):
+                if index in completed:
+                    continue
+                if not params["topic"]:
+                    # Registrado na saída como pulado: não conta como erro nem volta ao retomar
+                    append(output, {"input_index": index, **params, "skipped": "tópico vazio"})
+                    counters["skipped"] += 1
+                    continue
+                await queue.put((index, params))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+
+    elapsed = time.perf_counter() - started
+    processed = counters["done"] + counters["failed"] + counters["skipped"]
+    logger.info(
+        f"✅ Batch finalizado: {counters['done']} gerado(s), {counters['skipped']} pulado(s), {counters['failed']} erro(s) "
+        f"em {_format_eta(elapsed)} ({processed / elapsed if elapsed else 0:.2f} tópicos/s)"
+    )
+    return counters
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Orquestrador de posts Instagram")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="Gera posts para um arquivo de tópicos (CSV ou JSONL)")
+    batch.add_argument("input", help="Arquivo .csv (coluna topic) ou .jsonl")
+    batch.add_argument("--output", default="batch_results.ndjson", help="NDJSON de saída (também é o checkpoint)")
+    batch.add_argument("--errors", default=None, help="NDJSON de erros (padrão: <output>.errors.ndjson)")
+    batch.add_argument("--concurrency", type=int, default=4, help="Workflows simultâneos")
+    batch.add_argument("--style", default="Casual", help="Estilo quando a linha não define")
+    batch.add_argument("--tone", default="criativo", help="Tom quando a linha não define")
+    batch.add_argument("--target-audience", default="público geral", help="Público quando a linha não define")
+    batch.add_argument("--variants", type=int, default=1)
+    batch.add_argument("--token-budget", type=int, default=None)
+    batch.add_argument("--retries", type=int, default=2, help="Novas tentativas em timeout/conexão")
+    batch.add_argument("--progress-interval", type=float, default=10.0, help="Segundos entre relatórios")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
     orchestrator = Orchestrator(agent1_url=AGENT1_URL, agent2_url=AGENT2_URL)
-    
+    try:
+        return await _run_command(args, orchestrator)
+    finally:
+        await orchestrator.aclose()
+
+
+async def _run_command(args: argparse.Namespace, orchestrator: Orchestrator) -> int:
     agents_healthy = await orchestrator.verify_agents_health(retries=60, delay=1)
     if not agents_healthy:
         logger.error("❌ Agentes não estão saudáveis")
         return 1
     
+    if args.command == "batch":
+        counters = await run_batch(
+            orchestrator,
+            input_path=args.input,
+            output_path=args.output,
+            errors_path=args.errors or f"{args.output}.errors.ndjson",
+            defaults={"style": args.style, "tone": args.tone, "target_audience": args.target_audience},
+            concurrency=max(1, args.concurrency),
+            variants=args.variants,
+            token_budget=args.token_budget,
+            retries=args.retries,
+            progress_interval=args.progress_interval
+        )
+        return 1 if counters["failed"] else 0
+    
     try:
         result = await orchestrator.run_instagram_workflow(
             topic="Inteligência Artificial e Automação",
@@ -0,0 +1,291 @@
+"""
+Pré-geração de posts fora do horário de pico a partir de um calendário de conteúdo
+
+O calendário (tópico, estilo, tom, público e data-alvo) fica em SQLite. Um
+laço em segundo plano roda o workflow normal do orquestrador apenas dentro
+das janelas configuradas e respeitando as cotas (posts por hora e tokens por
+dia). Pedidos interativos que coincidem com uma entrada já gerada retornam
+o resultado armazenado imediatamente.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime, time as dtime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from main import PRIORITY_HEADER, forward_headers
+from semantic_cache import normalize_text, partition_key
+from usage import UsageLedger
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(topic: str, style: str, tone: str, target_audience: str) -> str:
+    """Chave exata (normalizada) de um pedido de post com 1 variante"""
+    return f"{partition_key(style, tone, target_audience, 1)}|{normalize_text(topic)}"
+
+
+def parse_windows(spec: str) -> List[Tuple[dtime, dtime]]:
+    """'22:00-06:00,13:00-14:00' -> [(22:00, 06:00), (13:00, 14:00)]"""
+    windows = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        start, end = part.split("-")
+        windows.append((dtime.fromisoformat(start.strip()), dtime.fromisoformat(end.strip())))
+    return windows
+
+
+def in_windows(now: datetime, windows: List[Tuple[dtime, dtime]]) -> bool:
+    current = now.time()
+    for start, end in windows:
+        if start <= end and start <= current < end:
+            return True
+        if start > end and (current >= start or current < end):
+            return True  # janela que atravessa a meia-noite
+    return False
+
+
+class PregenerationScheduler:
+    """Calendário de conteúdo + laço de pré-geração em janelas fora de pico"""
+
+    def __init__(
+        self,
+        run_workflow: Callable,
+        save_history: Callable[[Dict], str],
+        usage_ledger: UsageLedger,
+        db_path: Path,
+        windows: List[Tuple[dtime, dtime]],
+        max_per_hour: int = 20,
+        daily_token_limit: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        horizon_days: int = 7,
+        poll_interval: float = 60.0
+    ):
+        self.run_workflow = run_workflow
+        self.save_history = save_history
+        self.usage_ledger = usage_ledger
+        self.db_path = db_path
+        self.windows = windows
+        self.max_per_hour = max_per_hour
+        self.daily_token_limit = daily_token_limit
+        self.token_budget = token_budget
+        self.horizon_days = horizon_days
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS calendar (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    request_key TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    style TEXT NOT NULL,
+                    tone TEXT NOT NULL,
+                    target_audience TEXT NOT NULL,
+                    target_date TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    filename TEXT,
+                    result TEXT,
+                    error TEXT,
+                    updated_at TEXT NOT NULL,
+                    UNIQUE (request_key, target_date)
+                )
+            """)
+            # Entradas presas em 'running' (processo morto) voltam para a fila
+            stale = (datetime.now() - timedelta(hours=1)).isoformat()
+            conn.execute(
+                "UPDATE calendar SET status = 'pending' WHERE status = 'running' AND updated_at < ?",
+                (stale,)
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ============= CALENDÁRIO =============
+
+    def add_entries(self, entries: List[Dict]) -> int:
+        """Adiciona entradas ao calendário; duplicadas (mesma chave e data) são ignoradas"""
+        added = 0
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            for entry in entries:
+                style = entry["style"]
+                tone = entry.get("tone", "criativo")
+                audience = entry.get("target_audience", "público geral")
+                target_date = date.fromisoformat(str(entry["target_date"])).isoformat()
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO calendar
+                        (request_key, topic, style, tone, target_audience, target_date, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    request_key(entry["topic"], style, tone, audience),
+                    entry["topic"], style, tone, audience, target_date, now
+                ))
+                added += cursor.rowcount
+        return added
+
+    def load_file(self, path: Path) -> int:
+        """Carrega um calendário JSON: lista de entradas ou {"entries": [...]}"""
+        data = json.loads(path.read_text(encoding="utf-8"))
+        entries = data.get("entries", []) if isinstance(data, dict) else data
+        return self.add_entries(entries)
+
+    def list_entries(self, status: Optional[str] = None) -> List[Dict]:
+        query = "SELECT id, topic, style, tone, target_audience, target_date, status, attempts, filename, error, updated_at FROM calendar"
+        params: Tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query + " ORDER BY target_date, id", params)]
+
+    def lookup(self, topic: str, style: str, tone: str, target_audience: str) -> Optional[Dict]:
+        """Post pré-gerado para o pedido (data-alvo de hoje em diante), se existir"""
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT filename, result FROM calendar
+                WHERE request_key = ? AND status = 'done' AND target_date >= ?
+                ORDER BY target_date LIMIT 1
+            """, (request_key(topic, style, tone, target_audience), date.today().isoformat())).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row["result"])
+        result["metadata"]["pregenerated"] = {"filename": row["filename"]}
+        return result
+
+    # ============= COTAS E JANELAS =============
+
+    def _generated_last_hour(self) -> int:
+        since = (datetime.now() - timedelta(hours=1)).isoformat()
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM calendar WHERE status = 'done' AND updated_at >= ?", (since,)
+            ).fetchone()[0]
+
+    def can_run(self, now: Optional[datetime] = None) -> Tuple[bool, str]:
+        now = now or datetime.now()
+        if not in_windows(now, self.windows):
+            return False, "fora da janela de pré-geração"
+        if self._generated_last_hour() >= self.max_per_hour:
+            return False, f"cota de {self.max_per_hour} posts/hora atingida"
+        if self.daily_token_limit is not None and self.usage_ledger.total_for() >= self.daily_token_limit:
+            return False, f"cota diária de {self.daily_token_limit} tokens atingida"
+        return True, "ok"
+
+    def status(self) -> Dict:
+        allowed, reason = self.can_run()
+        with self._connect() as conn:
+            counts = {
+                row["status"]: row["total"]
+                for row in conn.execute("SELECT status, COUNT(*) AS total FROM calendar GROUP BY status")
+            }
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "can_run": allowed,
+            "reason": reason,
+            "windows": [f"{s.strftime('%H:%M')}-{e.strftime('%H:%M')}" for s, e in self.windows],
+            "max_per_hour": self.max_per_hour,
+            "generated_last_hour": self._generated_last_hour(),
+            "daily_token_limit": self.daily_token_limit,
+            "tokens_today": self.usage_ledger.total_for(),
+            "entries": counts
+        }
+
+    # ============= EXECUÇÃO =============
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Reserva atomicamente a próxima entrada pendente (seguro entre workers)"""
+        today = date.today()
+        horizon = (today + timedelta(days=self.horizon_days)).isoformat()
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT * FROM calendar
+                WHERE status = 'pending' AND target_date >= ? AND target_date <= ?
+                ORDER BY target_date, id LIMIT 5
+            """, (today.isoformat(), horizon)).fetchall()
+            for row in rows:
+                claimed = conn.execute(
+                    "UPDATE calendar SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                    "WHERE id = ? AND status = 'pending'",
+                    (datetime.now().isoformat(), row["id"])
+                ).rowcount
+                if claimed:
+                    return row
+        return None
+
+    def _finish(self, entry_id: int, status: str, filename: Optional[str] = None,
+                result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE calendar SET status = ?, filename = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, filename, json.dumps(result, ensure_ascii=False) if result else None,
+                 error, datetime.now().isoformat(), entry_id)
+            )
+
+    async def run_once(self) -> bool:
+        """Gera a próxima entrada do calendário; False se não havia nada a fazer"""
+        entry = await asyncio.to_thread(self._claim_next)
+        if entry is None:
+            return False
+        # Pré-geração entra na fila de lote do Agent 1, atrás dos pedidos interativos
+        forward_headers.set({**forward_headers.get(), PRIORITY_HEADER: "batch"})
+        logger.info(f"🌙 Pré-gerando '{entry['topic']}' para {entry['target_date']}")
+        try:
+            result = await self.run_workflow(
+                topic=entry["topic"],
+                style=entry["style"],
+                tone=entry["tone"],
+                target_audience=entry["target_audience"],
+                token_budget=self.token_budget
+            )
+            filename = await asyncio.to_thread(self.save_history, result)
+            await asyncio.to_thread(self.usage_ledger.record, result["metadata"]["usage"])
+            status = "failed" if result["metadata"]["usage"]["skipped_stages"] else "done"
+            await asyncio.to_thread(
+                self._finish, entry["id"], status, filename, result,
+                "orçamento de tokens excedido" if status == "failed" else None
+            )
+        except Exception as e:
+            logger.error(f"❌ Falha na pré-geração de '{entry['topic']}': {e}")
+            retry = "pending" if entry["attempts"] + 1 < 3 else "failed"
+            await asyncio.to_thread(self._finish, entry["id"], retry, error=str(e))
+        return True
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                allowed, reason = await asyncio.to_thread(self.can_run)
+                if allowed and await self.run_once():
+                    continue
+                if not allowed:
+                    logger.debug(f"Pré-geração em espera: {reason}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Erro no laço de pré-geração: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"🗓️ Pré-geração ativa nas janelas {self.status()['windows']}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
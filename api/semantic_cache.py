@@ -0,0 +1,156 @@
+"""
+Cache semântico do workflow completo
+
+Pedidos parafraseados ("IA e automação" vs "automação com inteligência
+artificial") reaproveitam um post já gerado em vez de pagar de novo o
+pipeline Ollama + Gemini. O tópico normalizado é convertido em embedding por
+um modelo local pequeno (CPU) e comparado, por similaridade de cosseno, com
+um índice NumPy em memória. Estilo, tom, público e número de variantes
+precisam coincidir exatamente (partição do índice).
+
+Dependências opcionais: numpy e sentence-transformers. Sem elas o cache fica
+desativado e o workflow roda normalmente.
+"""
+
+import copy
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def partition_key(style: str, tone: str, target_audience: str, variants: int) -> str:
+    return "|".join([normalize_text(style), normalize_text(tone), normalize_text(target_audience), str(variants)])
+
+
+def load_embedder(model_name: str = DEFAULT_MODEL) -> Optional[Callable[[str], "np.ndarray"]]:
+    """Carrega o modelo de embeddings local (CPU); None se indisponível"""
+    if np is None:
+        logger.warning("⚠️ Cache semântico desativado: numpy não instalado")
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("⚠️ Cache semântico desativado: sentence-transformers não instalado")
+        return None
+
+    model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(text: str) -> "np.ndarray":
+        return model.encode(text, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+    return embed
+
+
+class SemanticCache:
+    """Índice NumPy de embeddings com limiar de similaridade e despejo LRU"""
+
+    def __init__(self, embed: Callable[[str], "np.ndarray"], threshold: float = 0.9, max_entries: int = 512):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors = None  # matriz (max_entries, dim), alocada no primeiro store
+        self._partitions = [None] * max_entries
+        self._entries: Dict[int, Dict] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0, "embed_seconds": 0.0}
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticCache"]:
+        """Cria o cache se SEMANTIC_CACHE=1 e as dependências estiverem instaladas"""
+        if os.getenv("SEMANTIC_CACHE", "0") != "1":
+            return None
+        embed = load_embedder(os.getenv("SEMANTIC_CACHE_MODEL", DEFAULT_MODEL))
+        if embed is None:
+            return None
+        cache = cls(
+            embed,
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512")),
+        )
+        logger.info(f"🧠 Cache semântico ativo (limiar {cache.threshold}, até {cache.max_entries} posts)")
+        return cache
+
+    def _embed(self, topic: str) -> "np.ndarray":
+        start = time.perf_counter()
+        vector = self.embed(normalize_text(topic))
+        self.stats["embed_seconds"] += time.perf_counter() - start
+        return vector
+
+    def lookup(self, topic: str, partition: str) -> Optional[Tuple[Dict, float]]:
+        """Retorna (resultado armazenado, similaridade) se houver post acima do limiar"""
+        vector = self._embed(topic)
+        with self._lock:
+            self.stats["lookups"] += 1
+            if self._vectors is None or not self._entries:
+                self.stats["misses"] += 1
+                return None
+
+            slots = [slot for slot in self._entries if self._partitions[slot] == partition]
+            if not slots:
+                self.stats["misses"] += 1
+                return None
+
+            similarities = self._vectors[slots] @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            slot = slots[best]
+            self._lru.move_to_end(slot)
+            self.stats["hits"] += 1
+            return copy.deepcopy(self._entries[slot]), similarity
+
+    def store(self, topic: str, partition: str, result: Dict) -> None:
+        vector = self._embed(topic)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            if len(self._entries) < self.max_entries:
+                slot = next(i for i in range(self.max_entries) if i not in self._entries)
+            else:
+                slot, _ = self._lru.popitem(last=False)
+                self.stats["evictions"] += 1
+
+            self._vectors[slot] = vector
+            self._partitions[slot] = partition
+            self._entries[slot] = copy.deepcopy(result)
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+            self.stats["stores"] += 1
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["lookups"]
+            return {
+                **self.stats,
+                "embed_seconds": round(self.stats["embed_seconds"], 3),
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
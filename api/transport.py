@@ -0,0 +1,226 @@
+"""
+Transportes entre o orquestrador e os agentes
+
+HttpTransport faz a chamada HTTP normal (implantação distribuída), em JSON,
+comprimido com gzip quando o agente aceita (ver codec.py).
+InProcessTransport chama diretamente as funções dos agentes carregados no
+mesmo processo (modo monólito): sem serialização JSON, sem loopback HTTP e
+sem parse da resposta. Os dois expõem a mesma interface e as mesmas
+exceções, então os clientes não sabem qual estão usando. CassetteTransport
+envolve qualquer um deles para gravar ou reproduzir as chamadas (cassette.py).
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from shared.cassette import Cassette, CassetteMiss, request_key, shared_cassette
+from shared.codec import JSON_TYPE, compress, encode
+
+
+class TransportTimeout(Exception):
+    """O agente não respondeu dentro do timeout"""
+    pass
+
+
+class TransportConnectError(Exception):
+    """Não foi possível alcançar o agente"""
+    pass
+
+
+class TransportResponse:
+    """Resposta já decodificada, em processo ou do cassete (mesmos atributos usados do httpx.Response)"""
+
+    def __init__(self, status_code: int, data: Any):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self) -> Any:
+        return self._data
+
+    @property
+    def text(self) -> str:
+        return self._data if isinstance(self._data, str) else json.dumps(self._data, ensure_ascii=False)
+
+
+class HttpTransport:
+    """Chamadas HTTP ao agente em `base_url`
+
+    Com `compress_min_bytes` > 0, os corpos só passam a ir com gzip depois que
+    o agente mostra que os entende, então um agente antigo continua recebendo
+    JSON puro.
+
+    Um único httpx.AsyncClient (pool de conexões keep-alive) atende todas as
+    chamadas; o timeout vai em cada requisição. Feche com `aclose()`.
+    """
+
+    def __init__(self, base_url: str, compress_min_bytes: int = 0):
+        self.base_url = base_url.rstrip('/')
+        self.compress_min_bytes = compress_min_bytes
+        self._peer_gzip = False
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Criado na primeira chamada, já dentro do event loop que vai usá-lo
+        if self._client is None:
+            self._client = httpx.AsyncClient()
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _encode_body(self, payload: Dict, headers: Dict[str, str], allow_gzip: bool) -> bytes:
+        body = encode(payload)
+        headers["Content-Type"] = JSON_TYPE
+        if allow_gzip and self._peer_gzip:
+            body, encoding = compress(body, self.compress_min_bytes)
+            if encoding:
+                headers["Content-Encoding"] = encoding
+        return body
+
+    async def _send(
+        self, method: str, path: str, timeout: float,
+        payload: Optional[Dict], headers: Optional[Dict[str, str]], allow_gzip: bool = True
+    ) -> httpx.Response:
+        headers = dict(headers or {})
+        body = self._encode_body(payload, headers, allow_gzip) if payload is not None else None
+        headers["Accept-Encoding"] = "gzip" if self.compress_min_bytes > 0 else "identity"
+        try:
+            response = await self._get_client().request(
+                method, f"{self.base_url}{path}", content=body, headers=headers, timeout=timeout
+            )
+        except httpx.TimeoutException as e:
+            raise TransportTimeout(str(e)) from e
+        except httpx.ConnectError as e:
+            raise TransportConnectError(str(e)) from e
+
+        self._peer_gzip = "gzip" in response.headers.get("accept-encoding", "").lower()
+        return response
+
+    async def request(
+        self, method: str, path: str, timeout: float,
+        payload: Optional[Dict] = None, headers: Optional[Dict[str, str]] = None
+    ):
+        started = time.monotonic()
+        response = await self._send(method, path, timeout, payload, headers)
+        if response.status_code == 415 and "content-encoding" in response.request.headers:
+            # Agente substituído por um sem gzip: repete uma vez sem compressão,
+            # dentro do mesmo timeout
+            self._peer_gzip = False
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                raise TransportTimeout(f"{self.base_url}{path}: sem tempo para repetir sem gzip")
+            response = await self._send(method, path, remaining, payload, headers, allow_gzip=False)
+        return response
+
+    async def get(self, path: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+        return await self.request("GET", path, timeout, headers=headers)
+
+    async def post(self, path: str, payload: Dict, timeout: float, headers: Optional[Dict[str, str]] = None):
+        return await self.request("POST", path, timeout, payload=payload, headers=headers)
+
+    def __repr__(self) -> str:
+        return f"HttpTransport({self.base_url})"
+
+
+# Handler em processo: recebe o corpo (dict ou None) e os cabeçalhos
+InProcessHandler = Callable[[Optional[Dict], Mapping[str, str]], Awaitable[Any]]
+
+
+class InProcessTransport:
+    """Chama os handlers do agente diretamente, roteando por (método, caminho)"""
+
+    def __init__(self, name: str, routes: Dict[Tuple[str, str], InProcessHandler]):
+        self.name = name
+        self.routes = routes
+
+    async def request(
+        self, method: str, path: str, timeout: float,
+        payload: Optional[Dict] = None, headers: Optional[Dict[str, str]] = None
+    ) -> TransportResponse:
+        handler = self.routes.get((method, path))
+        if handler is None:
+            return TransportResponse(404, {"detail": f"{method} {path} não existe em {self.name}"})
+        try:
+            result = await asyncio.wait_for(handler(payload, headers or {}), timeout=timeout)
+        except asyncio.TimeoutError as e:
+            raise TransportTimeout(f"{self.name} excedeu {timeout:.1f}s") from e
+        except HTTPException as e:
+            return TransportResponse(e.status_code, {"detail": e.detail})
+        if isinstance(result, BaseModel):
+            result = result.model_dump()
+        return TransportResponse(200, result)
+
+    async def get(self, path: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+        return await self.request("GET", path, timeout, headers=headers)
+
+    async def post(self, path: str, payload: Dict, timeout: float, headers: Optional[Dict[str, str]] = None):
+        return await self.request("POST", path, timeout, payload=payload, headers=headers)
+
+    async def aclose(self) -> None:
+        pass
+
+    def __repr__(self) -> str:
+        return f"InProcessTransport({self.name})"
+
+
+class CassetteTransport:
+    """Grava (record) ou reproduz (replay) as chamadas feitas por `inner`"""
+
+    def __init__(self, inner, cassette: Cassette, name: str):
+        self.inner = inner
+        self.cassette = cassette
+        self.name = name
+
+    async def request(
+        self, method: str, path: str, timeout: float,
+        payload: Optional[Dict] = None, headers: Optional[Dict[str, str]] = None
+    ):
+        # Cabeçalhos (prazo, prioridade, profile) ficam fora da chave de propósito
+        key = request_key(self.name, method, path, payload)
+        if self.cassette.mode == "replay":
+            try:
+                entry = await asyncio.wait_for(self.cassette.replay(key), timeout=timeout)
+            except asyncio.TimeoutError as e:
+                raise TransportTimeout(f"{self.name} (replay) excedeu {timeout:.1f}s") from e
+            except CassetteMiss as e:
+                raise TransportConnectError(f"{method} {path}: {e}") from e
+            return TransportResponse(entry["status"], entry["response"])
+
+        start = time.perf_counter()
+        response = await self.inner.request(method, path, timeout, payload=payload, headers=headers)
+        latency = time.perf_counter() - start
+        try:
+            data = response.json()
+        except ValueError:
+            data = response.text
+        self.cassette.record(
+            key, {"method": method, "path": path, "payload": payload}, data, latency, response.status_code
+        )
+        return response
+
+    async def get(self, path: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+        return await self.request("GET", path, timeout, headers=headers)
+
+    async def post(self, path: str, payload: Dict, timeout: float, headers: Optional[Dict[str, str]] = None):
+        return await self.request("POST", path, timeout, payload=payload, headers=headers)
+
+    async def aclose(self) -> None:
+        if self.inner is not None:
+            await self.inner.aclose()
+
+    def __repr__(self) -> str:
+        return f"CassetteTransport({self.cassette.mode}, {self.inner!r})"
+
+
+def with_cassette(name: str, transport):
+    """Envolve o transporte num CassetteTransport quando CASSETTE_MODE está ligado"""
+    cassette = shared_cassette(name)
+    return CassetteTransport(transport, cassette, name) if cassette is not None else transport
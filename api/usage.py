@@ -0,0 +1,116 @@
+"""
+Contabilidade diária de tokens do Web API
+Agrega o uso de tokens de cada workflow por dia e por etapa em um SQLite local
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+class UsageLedger:
+    """Agregados diários de tokens por etapa (draft, improve, image)"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            # WAL: vários workers escrevendo sem bloquear os leitores
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_usage (
+                    day TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    total_tokens INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, stage)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_workflows (
+                    day TEXT PRIMARY KEY,
+                    workflows INTEGER NOT NULL DEFAULT 0,
+                    budget_exceeded INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, usage: Dict, day: Optional[date] = None) -> None:
+        """Soma o `metadata.usage` de um workflow ao agregado do dia"""
+        day_key = (day or date.today()).isoformat()
+        with self._connect() as conn:
+            for stage, totals in usage.get("stages", {}).items():
+                conn.execute("""
+                    INSERT INTO daily_usage (day, stage, prompt_tokens, completion_tokens, total_tokens)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (day, stage) DO UPDATE SET
+                        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                        completion_tokens = completion_tokens + excluded.completion_tokens,
+                        total_tokens = total_tokens + excluded.total_tokens
+                """, (
+                    day_key, stage,
+                    totals.get("prompt_tokens", 0),
+                    totals.get("completion_tokens", 0),
+                    totals.get("total_tokens", 0),
+                ))
+            conn.execute("""
+                INSERT INTO daily_workflows (day, workflows, budget_exceeded)
+                VALUES (?, 1, ?)
+                ON CONFLICT (day) DO UPDATE SET
+                    workflows = workflows + 1,
+                    budget_exceeded = budget_exceeded + excluded.budget_exceeded
+            """, (day_key, int(bool(usage.get("budget_exceeded")))))
+
+    def daily(self, days: int = 7) -> List[Dict]:
+        """Retorna os agregados dos últimos `days` dias, do mais recente ao mais antigo"""
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        with self._connect() as conn:
+            workflows = {
+                row["day"]: row
+                for row in conn.execute(
+                    "SELECT * FROM daily_workflows WHERE day >= ?", (since,)
+                )
+            }
+            stages: Dict[str, Dict] = {}
+            for row in conn.execute(
+                "SELECT * FROM daily_usage WHERE day >= ? ORDER BY day DESC, stage", (since,)
+            ):
+                stages.setdefault(row["day"], {})[row["stage"]] = {
+                    "prompt_tokens": row["prompt_tokens"],
+                    "completion_tokens": row["completion_tokens"],
+                    "total_tokens": row["total_tokens"],
+                }
+
+        result = []
+        for day in sorted(set(workflows) | set(stages), reverse=True):
+            day_stages = stages.get(day, {})
+            row = workflows.get(day)
+            result.append({
+                "day": day,
+                "workflows": row["workflows"] if row else 0,
+                "budget_exceeded": row["budget_exceeded"] if row else 0,
+                "total_tokens": sum(s["total_tokens"] for s in day_stages.values()),
+                "stages": day_stages,
+            })
+        return result
+
+    def total_for(self, day: Optional[date] = None) -> int:
+        """Total de tokens consumidos no dia"""
+        day_key = (day or date.today()).isoformat()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(total_tokens), 0) AS total FROM daily_usage WHERE day = ?",
+                (day_key,)
+            ).fetchone()
+        return row["total"]
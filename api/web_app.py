@@ -3,19 +3,37 @@ FastAPI Web Interface para Orchestrator
 Fornece uma interface web interativa para gerar posts Instagram
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import httpx
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
 import asyncio
 import json
 import os
-from datetime import datetime
+import time
+import uuid
+from datetime import date, datetime
 from pathlib import Path
 import logging
 
+from main import (
+    DEADLINE_HEADER, PRIORITY_CLASSES, PRIORITY_HEADER, Orchestrator, OrchestratorError, AgentTimeoutError, AgentConnectionError,
+    forward_headers, request_deadline, stage_latency
+)
+from usage import UsageLedger
+from semantic_cache import SemanticCache
+from scheduler import PregenerationScheduler, parse_windows
+from http_cache import (
+    CompressionMiddleware, conditional_response, etag_from_stats, is_not_modified,
+    not_modified_response, validator_headers
+)
+from shared.profiling import PROFILE_HEADER, ProfilingMiddleware, current_profile
+from export import EXPORT_FORMATS, iter_export, parse_range, select_history_files, slice_stream, stream_length
+from shared.retention import ArchivedFile, RetentionManager
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,6 +42,16 @@ logger = logging.getLogger(__name__)
 AGENT1_URL = os.getenv("AGENT1_URL", "http://agent1-local:8001")
 AGENT2_URL = os.getenv("AGENT2_URL", "http://agent2-gemini:8002")
 
+# Cache semântico opcional (SEMANTIC_CACHE=1); por processo/worker
+semantic_cache = SemanticCache.from_env()
+
+orchestrator = Orchestrator(
+    agent1_url=AGENT1_URL,
+    agent2_url=AGENT2_URL,
+    cache=semantic_cache,
+    refine_on_hit=os.getenv("SEMANTIC_CACHE_REFINE", "0") == "1"
+)
+
 # Criar app FastAPI
 app = FastAPI(
     title="Instagram AI Post Generator",
@@ -40,173 +68,501 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressão de respostas acima de COMPRESSION_MIN_SIZE bytes
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    exclude_prefixes=("/api/export",)
+)
+
+# Profiling sob demanda (cabeçalho X-Profile com PROFILING=1, ou PROFILE_SAMPLE_RATE)
+ProfilingMiddleware.install(app, service="web-api", default_dir="/app/profiles")
+
+# Cache da página estática (revalidada por ETag quando expira)
+INDEX_PATH = Path(os.getenv("INDEX_PATH", "/app/index.html"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "86400"))
+
 # Diretório para histórico
-HISTORY_DIR = Path("/app/history")
+HISTORY_DIR = Path(os.getenv("HISTORY_DIR", "/app/history"))
 HISTORY_DIR.mkdir(exist_ok=True)
 
+# Prazo total de um POST /api/generate-post; o cliente pode pedir menos via X-Deadline-Ms
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "90"))
+
+# Agregados diários de tokens
+usage_ledger = UsageLedger(HISTORY_DIR / "usage.db")
+
 # ============= MODELOS =============
 
+class CalendarEntry(BaseModel):
+    topic: str
+    style: str
+    tone: str = "criativo"
+    target_audience: str = "público geral"
+    target_date: date
+
+class CalendarRequest(BaseModel):
+    entries: List[CalendarEntry]
+
 class WorkflowRequest(BaseModel):
     topic: str
     style: str
     tone: str = "criativo"
     target_audience: str = "público geral"
+    variants: int = Field(default=1, ge=1, le=8)
+    token_budget: Optional[int] = Field(default=None, ge=1)
+    image_style: str = "realistic"
+
+class RegenerateRequest(BaseModel):
+    topic: Optional[str] = None
+    style: Optional[str] = None
+    tone: Optional[str] = None
+    target_audience: Optional[str] = None
+    variants: Optional[int] = Field(default=None, ge=1, le=8)
+    image_style: Optional[str] = None
+    token_budget: Optional[int] = Field(default=None, ge=1)
 
 class WorkflowResponse(BaseModel):
     draft: str
     final_post: str
     image_prompt: str
+    image_prompt_hash: Optional[str] = None
     timestamp: str
+    alternatives: List[Dict] = []
+    metadata: Dict = {}
 
 # ============= ENDPOINTS =============
 
+_index_cache: Dict = {}
+
+def _save_history(workflow_result: Dict) -> str:
+    """Grava o post no histórico e retorna o nome do arquivo
+
+    O nome inclui microssegundos e um sufixo aleatório (sem colisão entre
+    workers) e a escrita é atômica (arquivo temporário + rename), para que
+    leitores nunca vejam um JSON pela metade. O JSON é compacto (sem
+    indentação): o histórico é lido pela API, não à mão.
+    """
+    filename = f"post_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:6]}.json"
+    tmp_path = HISTORY_DIR / f".{filename}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(workflow_result, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, HISTORY_DIR / filename)
+    return filename
+
+def _history_file(filename: str):
+    """Resolve um post do histórico: arquivo solto (Path) ou compactado (ArchivedFile)
+
+    Recusa nomes fora do diretório. Os dois tipos expõem `name`, `stat()` e
+    `read_bytes()`.
+    """
+    if "/" in filename or "\\" in filename or not filename.endswith(".json"):
+        raise HTTPException(status_code=404, detail="File not found")
+    filepath = HISTORY_DIR / filename
+    if filepath.is_file():
+        return filepath
+    archived = history_archive.get(filename)
+    if archived is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return archived
+
+# Pré-geração fora de pico a partir do calendário de conteúdo (PREGEN_ENABLED=1)
+PREGEN_ENABLED = os.getenv("PREGEN_ENABLED", "0") == "1"
+_daily_limit = os.getenv("PREGEN_DAILY_TOKEN_LIMIT")
+_pregen_budget = os.getenv("PREGEN_TOKEN_BUDGET")
+scheduler = PregenerationScheduler(
+    run_workflow=orchestrator.run_instagram_workflow,
+    save_history=_save_history,
+    usage_ledger=usage_ledger,
+    db_path=HISTORY_DIR / "calendar.db",
+    windows=parse_windows(os.getenv("PREGEN_WINDOWS", "22:00-06:00")),
+    max_per_hour=int(os.getenv("PREGEN_MAX_PER_HOUR", "20")),
+    daily_token_limit=int(_daily_limit) if _daily_limit else None,
+    token_budget=int(_pregen_budget) if _pregen_budget else None,
+    horizon_days=int(os.getenv("PREGEN_HORIZON_DAYS", "7")),
+    poll_interval=float(os.getenv("PREGEN_POLL_INTERVAL", "60"))
+)
+
+@app.on_event("startup")
+async def start_scheduler():
+    calendar_file = os.getenv("CONTENT_CALENDAR")
+    if calendar_file and Path(calendar_file).is_file():
+        added = scheduler.load_file(Path(calendar_file))
+        logger.info(f"🗓️ {added} entrada(s) nova(s) no calendário a partir de {calendar_file}")
+    if PREGEN_ENABLED:
+        # Cada worker roda o laço; a reserva atômica no SQLite evita gerar duas vezes
+        scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.stop()
+
+# Retenção: posts antigos vão para segmentos comprimidos e continuam legíveis
+# pela API (RETENTION_ENABLED=1 liga a compactação periódica)
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "0") == "1"
+retention = RetentionManager.from_env(
+    HISTORY_DIR, "post_*.json", "history", default_archive_dir=HISTORY_DIR / "archive"
+)
+history_archive = retention.archive
+
+@app.on_event("startup")
+async def start_retention():
+    if RETENTION_ENABLED:
+        # Cada worker roda o laço; um lock de arquivo deixa só um compactar por vez
+        retention.start()
+
+@app.on_event("shutdown")
+async def stop_retention():
+    await retention.stop()
+
+@app.on_event("shutdown")
+async def close_agent_connections():
+    await orchestrator.aclose()
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Retorna a página HTML principal"""
-    return FileResponse("/app/index.html", media_type="text/html")
+    st = INDEX_PATH.stat()
+    if _index_cache.get("mtime_ns") != st.st_mtime_ns:
+        _index_cache.update(mtime_ns=st.st_mtime_ns, body=INDEX_PATH.read_bytes())
+    return conditional_response(
+        request,
+        _index_cache["body"],
+        media_type="text/html",
+        last_modified=st.st_mtime,
+        cache_control=f"public, max-age={STATIC_MAX_AGE}"
+    )
+
+def _request_budget(http_request: Request) -> float:
+    """Segundos disponíveis para a requisição (prazo da borda ou do cabeçalho, o menor)"""
+    budget = REQUEST_DEADLINE_S
+    header = http_request.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            budget = min(budget, max(0.0, int(header) / 1000))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{DEADLINE_HEADER} inválido")
+    return budget
+
+def _forward_request_headers(http_request: Request) -> None:
+    """Define os cabeçalhos repassados aos agentes nesta requisição"""
+    headers = {}
+    profile_id = current_profile.get()
+    if profile_id:
+        # Os agentes perfilam as mesmas chamadas, com o mesmo id no nome do arquivo
+        headers[PROFILE_HEADER] = profile_id
+    priority = http_request.headers.get(PRIORITY_HEADER)
+    if priority:
+        # Validado aqui: o 400 do Agent 1 viraria um erro 500 do workflow
+        if priority.lower() not in PRIORITY_CLASSES:
+            raise HTTPException(status_code=400, detail=f"{PRIORITY_HEADER} deve ser: {', '.join(PRIORITY_CLASSES)}")
+        headers[PRIORITY_HEADER] = priority.lower()
+    forward_headers.set(headers)
+
+async def _run_within_deadline(workflow, budget: float) -> Tuple[Dict, str]:
+    """Executa o workflow no prazo, registra o uso e grava no histórico"""
+    # Cada etapa usa o tempo restante como timeout; ao estourar o prazo as
+    # chamadas em andamento são canceladas (e os agentes também desistem)
+    request_deadline.set(time.monotonic() + budget)
+    workflow_result = await asyncio.wait_for(workflow, timeout=budget)
+    # SQLite e disco fora do event loop
+    await run_in_threadpool(usage_ledger.record, workflow_result["metadata"]["usage"])
+    filename = await run_in_threadpool(_save_history, workflow_result)
+    return workflow_result, filename
 
 @app.post("/api/generate-post")
-async def generate_post(request: WorkflowRequest):
+async def generate_post(request: WorkflowRequest, http_request: Request):
     """Executa o workflow e retorna o resultado"""
+    budget = _request_budget(http_request)
+    _forward_request_headers(http_request)
     try:
-        logger.info(f"📝 Gerando post para: {request.topic}")
+        logger.info(f"📝 Gerando post para: {request.topic} ({request.variants} variante(s))")
         
-        # Etapa 1: Gerar rascunho
-        logger.info("ETAPA 1: Gerando rascunho...")
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response1 = await client.post(
-                f"{AGENT1_URL}/api/tools/generate_draft",
-                json={
-                    "topic": request.topic,
-                    "style": request.style,
-                    "tone": request.tone
-                }
+        if request.variants == 1 and request.image_style == "realistic":
+            pregenerated = await run_in_threadpool(
+                scheduler.lookup, request.topic, request.style, request.tone, request.target_audience
             )
-            if response1.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Agent1 error: {response1.text}"
-                )
-            
-            result1 = response1.json()
-            draft = result1.get("content", [{}])[0].get("text", "") if isinstance(result1.get("content"), list) else result1.get("content", {}).get("text", "")
+            if pregenerated is not None:
+                logger.info(f"⚡ Post pré-gerado servido: {pregenerated['metadata']['pregenerated']['filename']}")
+                return WorkflowResponse(**pregenerated)
         
-        logger.info("ETAPA 2: Refinando com Gemini...")
-        # Etapa 2: Refinar
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response2 = await client.post(
-                f"{AGENT2_URL}/improve",
-                json={
-                    "draft_text": draft,
-                    "target_audience": request.target_audience
-                }
-            )
-            if response2.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Agent2 error: {response2.text}"
-                )
-            
-            result2 = response2.json()
-            final_post = result2.get("improved_text", "")
+        workflow_result, filename = await _run_within_deadline(
+            orchestrator.run_instagram_workflow(
+                topic=request.topic,
+                style=request.style,
+                tone=request.tone,
+                target_audience=request.target_audience,
+                variants=request.variants,
+                token_budget=request.token_budget,
+                image_style=request.image_style
+            ),
+            budget
+        )
         
-        logger.info("ETAPA 3: Gerando prompt de imagem...")
-        # Etapa 3: Gerar prompt de imagem
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response3 = await client.post(
-                f"{AGENT2_URL}/generate-image",
-                json={
-                    "prompt": final_post,
-                    "style": "realistic"
-                }
-            )
-            if response3.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Agent2 image error: {response3.text}"
-                )
-            
-            result3 = response3.json()
-            image_prompt = result3.get("image_path", "")
+        logger.info(f"✅ Post gerado com sucesso! Salvo em {filename}")
         
-        # Salvar no histórico
-        workflow_result = {
-            "draft": draft,
-            "final_post": final_post,
-            "image_prompt": image_prompt,
-            "timestamp": datetime.now().isoformat(),
-            "metadata": {
-                "topic": request.topic,
-                "style": request.style,
-                "tone": request.tone,
-                "target_audience": request.target_audience
-            }
-        }
+        return WorkflowResponse(**workflow_result)
+    
+    except (AgentTimeoutError, asyncio.TimeoutError):
+        raise HTTPException(status_code=504, detail="Agents timeout - took too long")
+    except AgentConnectionError as e:
+        raise HTTPException(status_code=503, detail=f"Cannot connect to agents: {str(e)}")
+    except OrchestratorError as e:
+        logger.error(f"❌ Erro: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Erro: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/regenerate/{filename}")
+async def regenerate_post(filename: str, request: RegenerateRequest, http_request: Request):
+    """
+    Refaz um post do histórico trocando alguns parâmetros
+    
+    Só as etapas cujas entradas mudaram são executadas (ex: trocar só o
+    image_style refaz apenas a descrição da imagem); as demais saídas são
+    reaproveitadas do post de origem.
+    """
+    previous = json.loads(_history_file(filename).read_bytes())
+    budget = _request_budget(http_request)
+    _forward_request_headers(http_request)
+    try:
+        logger.info(f"🔁 Regenerando {filename}")
         
-        # Salvar arquivo
-        filename = f"post_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        filepath = HISTORY_DIR / filename
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(workflow_result, f, ensure_ascii=False, indent=2)
+        overrides = request.model_dump(exclude={"token_budget"}, exclude_none=True)
+        workflow_result, new_filename = await _run_within_deadline(
+            orchestrator.regenerate(
+                previous, token_budget=request.token_budget, source=filename, **overrides
+            ),
+            budget
+        )
         
-        logger.info(f"✅ Post gerado com sucesso! Salvo em {filename}")
+        logger.info(
+            f"✅ Post regenerado ({', '.join(workflow_result['metadata']['reused_stages']) or 'nada'} "
+            f"reaproveitado). Salvo em {new_filename}"
+        )
         
         return WorkflowResponse(**workflow_result)
     
-    except httpx.TimeoutException:
+    except (AgentTimeoutError, asyncio.TimeoutError):
         raise HTTPException(status_code=504, detail="Agents timeout - took too long")
-    except httpx.ConnectError as e:
+    except AgentConnectionError as e:
         raise HTTPException(status_code=503, detail=f"Cannot connect to agents: {str(e)}")
+    except OrchestratorError as e:
+        logger.error(f"❌ Erro: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Erro: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+_history_cache: Dict = {}
+
 @app.get("/api/history")
-async def get_history():
+async def get_history(request: Request):
     """Retorna histórico de posts gerados"""
     try:
         files = sorted(HISTORY_DIR.glob("post_*.json"), reverse=True)[:10]
-        history = []
+        if len(files) < 10:
+            # Completa com os mais recentes já compactados
+            loose = {file.name for file in files}
+            archived = history_archive.entries(newest_first=True, limit=10)
+            files += [entry for entry in archived if entry.name not in loose][:10 - len(files)]
+        stats = [file.stat() for file in files]
         
-        for file in files:
-            with open(file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+        # Validador calculado só com nomes e stat(): sem abrir os arquivos
+        etag = etag_from_stats(stats, salt="|".join(file.name for file in files))
+        last_modified = max((st.st_mtime for st in stats), default=0)
+        headers = validator_headers(etag, last_modified, "no-cache")
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(headers)
+        
+        if _history_cache.get("etag") != etag:
+            history = []
+            for file in files:
+                data = json.loads(file.read_bytes())
                 history.append({
                     "filename": file.name,
                     "timestamp": data.get("timestamp"),
                     "topic": data.get("metadata", {}).get("topic"),
                     "final_post": data.get("final_post")
                 })
+            body = json.dumps({"history": history}, ensure_ascii=False).encode("utf-8")
+            _history_cache.update(etag=etag, body=body)
         
-        return {"history": history}
+        return conditional_response(
+            request, _history_cache["body"], "application/json",
+            last_modified=last_modified, etag=etag
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/history/{filename}")
-async def get_history_item(filename: str):
+async def get_history_item(filename: str, request: Request):
     """Retorna um item específico do histórico"""
     try:
-        filepath = HISTORY_DIR / filename
-        if not filepath.exists():
-            raise HTTPException(status_code=404, detail="File not found")
+        filepath = _history_file(filename)
+        st = filepath.stat()
+        etag = etag_from_stats([st], salt=filename)
+        headers = validator_headers(etag, st.st_mtime, "no-cache")
+        if is_not_modified(request, etag, st.st_mtime):
+            return not_modified_response(headers)
         
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
+        # O arquivo já é JSON: devolve os bytes sem parse/reserialização
+        return conditional_response(
+            request, filepath.read_bytes(), "application/json",
+            last_modified=st.st_mtime, etag=etag
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request):
     """Download um JSON do histórico"""
     try:
-        filepath = HISTORY_DIR / filename
-        if not filepath.exists():
-            raise HTTPException(status_code=404, detail="File not found")
+        filepath = _history_file(filename)
+        st = filepath.stat()
+        etag = etag_from_stats([st], salt=filename)
+        headers = validator_headers(etag, st.st_mtime, "no-cache")
+        if is_not_modified(request, etag, st.st_mtime):
+            return not_modified_response(headers)
         
-        return FileResponse(filepath, filename=filename)
+        if isinstance(filepath, ArchivedFile):
+            headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return Response(content=filepath.read_bytes(), media_type="application/json", headers=headers)
+        return FileResponse(filepath, filename=filename, stat_result=st, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _export_files(start_date: Optional[date], end_date: Optional[date]) -> Tuple[List[Path], List[os.stat_result]]:
+    """Arquivos do intervalo (histórico e arquivo morto) com o stat de cada um, para a ETag"""
+    files, stats = [], []
+    for file in select_history_files(HISTORY_DIR, start_date, end_date, archive=history_archive):
+        try:
+            stats.append(file.stat())
+            files.append(file)
+        except FileNotFoundError:
+            continue
+    return files, stats
+
+@app.get("/api/export")
+async def export_history(
+    request: Request,
+    fmt: str = Query("ndjson", alias="format"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    topic: Optional[str] = None
+):
+    """
+    Exporta em fluxo todos os posts do intervalo de datas (e tópico, opcional)
+    
+    Formatos: ndjson, ndjson.gz ou zip. Suporta Range/If-Range para retomar
+    downloads interrompidos.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Use: {', '.join(EXPORT_FORMATS)}")
+    
+    # Listagem e stat de cada arquivo fora do event loop
+    files, stats = await run_in_threadpool(_export_files, start_date, end_date)
+    
+    media_type, extension = EXPORT_FORMATS[fmt]
+    etag = etag_from_stats(
+        stats, salt=f"{fmt}|{start_date}|{end_date}|{topic}|" + "|".join(f.name for f in files)
+    )
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f'attachment; filename="posts_export.{extension}"'
+    }
+    
+    byte_range = parse_range(request.headers.get("range"))
+    if_range = request.headers.get("if-range")
+    if byte_range and (if_range is None or if_range.strip() == etag):
+        # Retomada: o fluxo é determinístico, então é regenerado e fatiado
+        total = await run_in_threadpool(stream_length, iter_export(fmt, files, topic))
+        first, last = byte_range
+        last = total - 1 if last is None else min(last, total - 1)
+        if first >= total:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+        headers.update({
+            "Content-Range": f"bytes {first}-{last}/{total}",
+            "Content-Length": str(last - first + 1)
+        })
+        return StreamingResponse(
+            slice_stream(iter_export(fmt, files, topic), first, last),
+            status_code=206,
+            media_type=media_type,
+            headers=headers
+        )
+    
+    logger.info(f"📦 Exportando {len(files)} post(s) em {fmt}")
+    return StreamingResponse(iter_export(fmt, files, topic), media_type=media_type, headers=headers)
+
+@app.get("/api/usage")
+async def get_usage(days: int = 7):
+    """Retorna os agregados diários de tokens (por etapa) dos últimos dias"""
+    try:
+        days = max(1, min(days, 365))
+        return {"days": usage_ledger.daily(days)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/calendar")
+async def get_calendar(status: Optional[str] = None):
+    """Lista as entradas do calendário de conteúdo (pending, running, done, failed)"""
+    try:
+        return {"entries": await run_in_threadpool(scheduler.list_entries, status)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/calendar")
+async def add_calendar_entries(request: CalendarRequest):
+    """Adiciona tópicos ao calendário para pré-geração fora de pico"""
+    try:
+        added = await run_in_threadpool(
+            scheduler.add_entries, [entry.model_dump() for entry in request.entries]
+        )
+        return {"added": added, "ignored": len(request.entries) - added}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/scheduler")
+async def get_scheduler_status():
+    """Estado da pré-geração: janela atual, cotas e entradas por status"""
+    return {"enabled": PREGEN_ENABLED, **await run_in_threadpool(scheduler.status)}
+
+@app.get("/api/retention")
+async def get_retention_status():
+    """Arquivos soltos, segmentos compactados e relatórios das últimas passadas"""
+    status = await run_in_threadpool(retention.status)
+    status["enabled"] = RETENTION_ENABLED
+    return status
+
+@app.post("/api/retention/run")
+async def run_retention():
+    """Roda uma passada de compactação agora e devolve o espaço recuperado"""
+    report = await run_in_threadpool(retention.run_once)
+    if "skipped" in report:
+        raise HTTPException(status_code=409, detail=report["skipped"])
+    return report
+
+@app.get("/api/timeouts")
+async def get_timeouts():
+    """Latências observadas por etapa (p50/p95/p99) e o timeout adaptativo atual deste worker"""
+    return {"request_deadline_s": REQUEST_DEADLINE_S, "stages": stage_latency.snapshot()}
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Métricas do cache semântico deste worker (hit rate, entradas, despejos)"""
+    if semantic_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "worker_pid": os.getpid(), **semantic_cache.metrics()}
+
 @app.get("/health")
 async def health():
     """Health check"""
@@ -214,4 +570,4 @@ async def health():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run("web_app:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WORKERS", "1")))
\ No newline at end of file
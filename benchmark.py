@@ -0,0 +1,616 @@
+"""
+Benchmarks do sistema de geração de posts
+
+Uso:
+    # Throughput do Web API com 1, 2 e 4 workers (não precisa dos agentes)
+    python benchmark.py workers --workers 1,2,4 --duration 10
+
+    # Custo dos saltos HTTP: orquestrador via HTTP vs agentes em processo
+    python benchmark.py transport --workflows 500 --concurrency 8
+
+    # Payloads com e sem gzip: tamanho, tempo por mensagem e HTTP ponta a ponta
+    python benchmark.py codec --workflows 200 --variants 3
+
+    # Regressão de latência: reproduz uma amostra gravada com CASSETTE_MODE=record
+    python benchmark.py replay --cassettes ./cassettes --speed 0 --save base.json
+    python benchmark.py replay --cassettes ./cassettes --speed 0 --baseline base.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+# Cores para output
+GREEN = '\033[92m'
+RED = '\033[91m'
+YELLOW = '\033[93m'
+BLUE = '\033[94m'
+RESET = '\033[0m'
+
+ROOT_DIR = Path(__file__).resolve().parent
+API_DIR = ROOT_DIR / "api"
+
+
+def print_header(text):
+    print(f"\n{BLUE}{'='*60}{RESET}")
+    print(f"{BLUE}{text.center(60)}{RESET}")
+    print(f"{BLUE}{'='*60}{RESET}\n")
+
+
+def print_success(text):
+    print(f"{GREEN}✓ {text}{RESET}")
+
+
+def print_error(text):
+    print(f"{RED}✗ {text}{RESET}")
+
+
+def print_info(text):
+    print(f"{YELLOW}ℹ {text}{RESET}")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# ============= WORKERS =============
+
+def seed_history(history_dir: Path, posts: int) -> list:
+    """Cria posts sintéticos no formato do histórico"""
+    names = []
+    for i in range(posts):
+        name = f"post_20250101_{i:06d}_000000_bench{i:04d}.json"
+        post = {
+            "draft": "Rascunho de teste " * 20,
+            "final_post": f"Post final número {i} ✨ " * 10,
+            "image_prompt": "Uma cena detalhada com iluminação suave " * 15,
+            "timestamp": "2025-01-01T00:00:00",
+            "metadata": {"topic": f"Tópico {i % 50}", "style": "Casual", "tone": "criativo",
+                         "target_audience": "público geral"}
+        }
+        (history_dir / name).write_text(json.dumps(post, ensure_ascii=False, indent=2), encoding="utf-8")
+        names.append(name)
+    return names
+
+
+async def _load_client(base_url, paths, duration, concurrency):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(random.choice(paths))
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def _load_process(args):
+    base_url, paths, duration, concurrency = args
+    return asyncio.run(_load_client(base_url, paths, duration, concurrency))
+
+
+def wait_until_up(base_url: str, timeout: float = 30.0, path: str = "/health") -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}{path}", timeout=1.0).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def run_workers_benchmark(args) -> int:
+    print_header("THROUGHPUT DO WEB API POR NÚMERO DE WORKERS")
+    worker_counts = [int(n) for n in args.workers.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history_dir = Path(tmp)
+        names = seed_history(history_dir, args.posts)
+        paths = [f"/api/history/{name}" for name in names] + ["/api/history"]
+        print_info(f"{args.posts} posts sintéticos em {history_dir}")
+        print_info(f"Carga: {args.concurrency} conexões em {args.load_procs} processo(s), {args.duration}s por rodada\n")
+
+        env = dict(
+            os.environ, HISTORY_DIR=str(history_dir), INDEX_PATH=str(API_DIR / "index.html"),
+            PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT_DIR), os.environ.get("PYTHONPATH")]))  # shared/
+        )
+        results = []
+        for workers in worker_counts:
+            port = args.port
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "web_app:app", "--host", "127.0.0.1",
+                 "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                cwd=API_DIR, env=env
+            )
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                if not wait_until_up(base_url):
+                    print_error(f"Web API não subiu com {workers} worker(s)")
+                    return 1
+
+                per_proc = max(1, args.concurrency // args.load_procs)
+                with multiprocessing.Pool(args.load_procs) as pool:
+                    outputs = pool.map(
+                        _load_process,
+                        [(base_url, paths, args.duration, per_proc)] * args.load_procs
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+            latencies = [lat for lats, _ in outputs for lat in lats]
+            errors = sum(err for _, err in outputs)
+            throughput = len(latencies) / args.duration
+            results.append((workers, throughput, latencies, errors))
+            print_success(
+                f"{workers} worker(s): {throughput:8.1f} req/s  "
+                f"p50={percentile(latencies, 50)*1000:6.1f}ms  "
+                f"p99={percentile(latencies, 99)*1000:6.1f}ms  erros={errors}"
+            )
+
+    baseline = results[0][1] or 1.0
+    print_header("RESUMO")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'média ms':>9}")
+    for workers, throughput, latencies, _ in results:
+        mean_ms = statistics.mean(latencies) * 1000 if latencies else 0.0
+        print(f"{workers:>8} {throughput:>10.1f} {throughput / baseline:>7.2f}x {mean_ms:>9.1f}")
+    return 0
+
+
+# ============= TRANSPORTE =============
+
+STUB_USAGE = {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30}
+
+_WORDS = (
+    "café conteúdo marca público engajamento dica manhã energia sabor especial "
+    "receita equipe cliente história momento comunidade lançamento novidade "
+    "produto qualidade experiência semana desafio resultado ideia criativo "
+    "tecnologia inovação dia hoje você nosso melhor sempre juntos agora "
+    "descubra aproveite compartilhe comente siga transforme inspire crie"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    """Texto sintético com vocabulário real (não comprime como repetição pura)"""
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def stub_agent_routes(delay: float, seed: int = 42):
+    """Handlers que imitam as respostas dos agentes (sem modelo), com atraso opcional"""
+    rng = random.Random(seed)
+
+    async def health(payload, headers):
+        return {"status": "online"}
+
+    async def draft(payload, headers):
+        await asyncio.sleep(delay)
+        texts = [f"{payload['topic']}: {_text(rng, 90)}" for _ in range(payload.get("variants", 1))]
+        return {"content": [{"type": "text", "text": t} for t in texts], "usage": STUB_USAGE}
+
+    async def improve(payload, headers):
+        await asyncio.sleep(delay)
+        return {"improved_text": "✨ " + payload["draft_text"] + " " + _text(rng, 20),
+                "hashtags": [f"#{rng.choice(_WORDS)}" for _ in range(8)],
+                "agent": "stub", "model": "stub", "usage": STUB_USAGE}
+
+    async def improve_variants(payload, headers):
+        await asyncio.sleep(delay)
+        ranked = [
+            {"index": i, "score": round(rng.random() * 10, 2), "improved_text": "✨ " + text + " " + _text(rng, 20),
+             "hashtags": [f"#{rng.choice(_WORDS)}" for _ in range(8)]}
+            for i, text in enumerate(payload["drafts"])
+        ]
+        ranked.sort(key=lambda variant: variant["score"], reverse=True)
+        return {"best": ranked[0], "alternatives": ranked[1:], "agent": "stub", "model": "stub", "usage": STUB_USAGE}
+
+    async def image(payload, headers):
+        await asyncio.sleep(delay)
+        return {"image_prompt": _text(rng, 120), "prompt_hash": "%064x" % rng.getrandbits(256),
+                "agent": "stub", "model": "stub", "usage": STUB_USAGE}
+
+    agent1 = {("GET", "/"): health, ("POST", "/api/tools/generate_draft"): draft}
+    agent2 = {("GET", "/"): health, ("POST", "/improve"): improve,
+              ("POST", "/improve-variants"): improve_variants, ("POST", "/generate-image"): image}
+    return agent1, agent2
+
+
+def _http_app(routes):
+    """FastAPI com os mesmos handlers, para o modo HTTP"""
+    from fastapi import FastAPI, Request
+    from shared.codec import CodecMiddleware
+
+    app = FastAPI()
+    CodecMiddleware.install(app)
+    for (method, path), handler in routes.items():
+        async def endpoint(request: Request, handler=handler):
+            payload = await request.json() if request.method == "POST" else None
+            return await handler(payload, request.headers)
+        app.add_api_route(path, endpoint, methods=[method])
+    return app
+
+
+def _serve_in_thread(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server, thread
+
+
+async def _warm_and_measure(orchestrator, workflows: int, concurrency: int, variants: int = 1):
+    """Aquecimento e medição no mesmo event loop (o pool de conexões é reaproveitado)"""
+    try:
+        await _run_workflows(orchestrator, min(20, workflows), concurrency, variants)
+        return await _run_workflows(orchestrator, workflows, concurrency, variants)
+    finally:
+        await orchestrator.aclose()
+
+
+async def _run_workflows(orchestrator, workflows: int, concurrency: int, variants: int = 1):
+    latencies, results = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            results.append(await orchestrator.run_instagram_workflow(
+                topic=f"Tópico {i}", style="Casual", variants=variants
+            ))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(workflows)))
+    return latencies, time.perf_counter() - start, results
+
+
+def run_transport_benchmark(args) -> int:
+    print_header("ORQUESTRADOR: HTTP vs EM PROCESSO")
+    sys.path.insert(0, str(API_DIR))
+    import logging
+    import main as orchestrator_module
+    from transport import HttpTransport, InProcessTransport
+    for name in ("main", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    agent1_routes, agent2_routes = stub_agent_routes(args.delay_ms / 1000)
+    print_info(f"{args.workflows} workflows, concorrência {args.concurrency}, "
+               f"atraso simulado do modelo {args.delay_ms}ms por etapa, gzip a partir de "
+               f"{args.compress_min_bytes or '-'} bytes\n")
+
+    servers = [
+        _serve_in_thread(_http_app(agent1_routes), args.port),
+        _serve_in_thread(_http_app(agent2_routes), args.port + 1),
+    ]
+    try:
+        if not all(wait_until_up(f"http://127.0.0.1:{port}", path="/") for port in (args.port, args.port + 1)):
+            print_error("Agentes stub não subiram")
+            return 1
+
+        modes = {
+            "http": orchestrator_module.Orchestrator(
+                agent1_transport=HttpTransport(f"http://127.0.0.1:{args.port}", args.compress_min_bytes),
+                agent2_transport=HttpTransport(f"http://127.0.0.1:{args.port + 1}", args.compress_min_bytes)
+            ),
+            "em processo": orchestrator_module.Orchestrator(
+                agent1_transport=InProcessTransport("agent1", agent1_routes),
+                agent2_transport=InProcessTransport("agent2", agent2_routes)
+            ),
+        }
+        results = {}
+        for name, orchestrator in modes.items():
+            latencies, elapsed, _ = asyncio.run(_warm_and_measure(orchestrator, args.workflows, args.concurrency))
+            results[name] = (latencies, elapsed)
+            print_success(
+                f"{name:>12}: {args.workflows / elapsed:8.1f} workflows/s  "
+                f"p50={percentile(latencies, 50)*1000:7.2f}ms  p99={percentile(latencies, 99)*1000:7.2f}ms"
+            )
+    finally:
+        for server, thread in servers:
+            server.should_exit = True
+            thread.join(timeout=5)
+
+    http_p50 = percentile(results["http"][0], 50)
+    local_p50 = percentile(results["em processo"][0], 50)
+    print_header("RESUMO")
+    print(f"Overhead dos saltos HTTP por workflow (p50): {(http_p50 - local_p50)*1000:.2f}ms")
+    print(f"Ganho de throughput em processo: {results['http'][1] / results['em processo'][1]:.2f}x")
+    return 0
+
+
+# ============= CODEC =============
+
+class _RecordingTransport:
+    """Guarda os corpos trocados com o agente (para medir payloads reais do orquestrador)"""
+
+    def __init__(self, inner, messages: dict):
+        self.inner = inner
+        self.messages = messages
+
+    async def request(self, method, path, timeout, payload=None, headers=None):
+        response = await self.inner.request(method, path, timeout, payload=payload, headers=headers)
+        if payload is not None:
+            self.messages.setdefault(f"{path} (requisição)", []).append(payload)
+            self.messages.setdefault(f"{path} (resposta)", []).append(response.json())
+        return response
+
+    async def get(self, path, timeout, headers=None):
+        return await self.request("GET", path, timeout, headers=headers)
+
+    async def post(self, path, payload, timeout, headers=None):
+        return await self.request("POST", path, timeout, payload=payload, headers=headers)
+
+
+def _time_per_item(func, items, repeat: int) -> float:
+    """Tempo médio por item, em microssegundos (melhor de `repeat` rodadas)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items) * 1e6
+
+
+def run_codec_benchmark(args) -> int:
+    print_header("COMPRESSÃO DOS PAYLOADS")
+    sys.path.insert(0, str(API_DIR))
+    import logging
+    import main as orchestrator_module
+    from shared.codec import encode
+    from transport import HttpTransport, InProcessTransport
+    for name in ("main", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    # Payloads reais do orquestrador num lote, contra agentes stub
+    messages: dict = {}
+    agent1_routes, agent2_routes = stub_agent_routes(0.0, seed=args.seed)
+    orchestrator = orchestrator_module.Orchestrator(
+        agent1_transport=_RecordingTransport(InProcessTransport("agent1", agent1_routes), messages),
+        agent2_transport=_RecordingTransport(InProcessTransport("agent2", agent2_routes), messages)
+    )
+    _, _, results = asyncio.run(_run_workflows(orchestrator, args.workflows, 8, args.variants))
+    messages["histórico (post salvo)"] = results
+    if args.history:
+        real = [json.loads(p.read_text(encoding="utf-8")) for p in sorted(Path(args.history).glob("post_*.json"))]
+        if real:
+            messages["histórico real"] = real[:args.workflows]
+
+    formats = {
+        "json indent=2": (lambda d: json.dumps(d, ensure_ascii=False, indent=2).encode("utf-8"), json.loads),
+        "json compacto": (encode, json.loads),
+        "json + gzip": (lambda d: gzip.compress(encode(d), 5), lambda b: json.loads(gzip.decompress(b))),
+    }
+    print_info(f"{args.workflows} workflows com {args.variants} variante(s); tempos por mensagem (melhor de {args.repeat})\n")
+
+    totals = {name: 0 for name in formats}
+    for kind, items in messages.items():
+        print(f"{BLUE}{kind}{RESET} ({len(items)} mensagens)")
+        print(f"  {'formato':<16}{'bytes/msg':>11}{'vs json':>9}{'encode µs':>11}{'decode µs':>11}")
+        baseline = None
+        for name, (enc, dec) in formats.items():
+            bodies = [enc(item) for item in items]
+            size = sum(len(body) for body in bodies) / len(bodies)
+            totals[name] += sum(len(body) for body in bodies)
+            baseline = size if name == "json compacto" else baseline
+            enc_us = _time_per_item(enc, items, args.repeat)
+            dec_us = _time_per_item(dec, bodies, args.repeat)
+            ratio = f"{size / baseline:.0%}" if baseline else "-"
+            print(f"  {name:<16}{size:>11.0f}{ratio:>9}{enc_us:>11.1f}{dec_us:>11.1f}")
+        print()
+
+    # Ponta a ponta: o mesmo lote por HTTP, passando pelo CodecMiddleware dos stubs
+    print(f"{BLUE}HTTP ponta a ponta{RESET} (concorrência {args.concurrency})")
+    servers = [
+        _serve_in_thread(_http_app(agent1_routes), args.port),
+        _serve_in_thread(_http_app(agent2_routes), args.port + 1),
+    ]
+    try:
+        if not all(wait_until_up(f"http://127.0.0.1:{port}", path="/") for port in (args.port, args.port + 1)):
+            print_error("Agentes stub não subiram")
+            return 1
+        for name, min_bytes in (("json", 0), (f"json + gzip >= {args.compress_min_bytes} B", args.compress_min_bytes)):
+            http = orchestrator_module.Orchestrator(
+                agent1_transport=HttpTransport(f"http://127.0.0.1:{args.port}", min_bytes),
+                agent2_transport=HttpTransport(f"http://127.0.0.1:{args.port + 1}", min_bytes)
+            )
+            latencies, elapsed, _ = asyncio.run(
+                _warm_and_measure(http, args.workflows, args.concurrency, args.variants)
+            )
+            print(f"  {name:<24}{args.workflows / elapsed:8.1f} workflows/s  "
+                  f"p50={percentile(latencies, 50)*1000:7.2f}ms  p99={percentile(latencies, 99)*1000:7.2f}ms")
+    finally:
+        for server, thread in servers:
+            server.should_exit = True
+            thread.join(timeout=5)
+
+    print_header("RESUMO")
+    base = totals["json compacto"]
+    for name, total in totals.items():
+        print(f"{name:<16} {total / 1024:10.1f} KiB  ({total / base:.0%} do JSON compacto)")
+    return 0
+
+
+# ============= REPLAY =============
+
+def run_replay_benchmark(args) -> int:
+    print_header("REPLAY DE TRÁFEGO GRAVADO")
+    sys.path.insert(0, str(API_DIR))
+    import logging
+    import main as orchestrator_module
+    from shared.cassette import Cassette
+    from transport import CassetteTransport
+    for name in ("main", "httpx", "shared.cassette"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    directory = Path(args.cassettes)
+    try:
+        workflows = Cassette(directory / "workflows.ndjson", "replay").entries()
+        agents = {
+            name: CassetteTransport(None, Cassette(directory / f"{name}.ndjson", "replay", args.speed), name)
+            for name in ("agent1", "agent2")
+        }
+    except FileNotFoundError as e:
+        print_error(str(e))
+        return 1
+    workflows.sort(key=lambda entry: entry["recorded_at"])
+    if args.limit:
+        workflows = workflows[:args.limit]
+    if not workflows:
+        print_error("Nenhum workflow gravado")
+        return 1
+
+    speed = "sem espera" if args.speed == 0 else f"{args.speed}x a velocidade gravada"
+    print_info(f"{len(workflows)} workflows de {directory}, concorrência {args.concurrency}, {speed}\n")
+
+    orchestrator = orchestrator_module.Orchestrator(
+        agent1_transport=agents["agent1"], agent2_transport=agents["agent2"]
+    )
+    latencies, errors, changed = [], [], 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(entry):
+        nonlocal changed
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await orchestrator.run_instagram_workflow(**entry["request"])
+            except Exception as e:
+                errors.append(f"{entry['request'].get('topic')}: {e}")
+                return
+            latencies.append(time.perf_counter() - start)
+            if result["final_post"] != entry["response"]["final_post"]:
+                changed += 1
+
+    async def run_all():
+        start = time.perf_counter()
+        await asyncio.gather(*(one(entry) for entry in workflows))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run_all())
+    recorded = [entry["latency_s"] for entry in workflows]
+    report = {
+        "workflows": len(workflows),
+        "errors": len(errors),
+        "changed_outputs": changed,
+        "speed": args.speed,
+        "concurrency": args.concurrency,
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "recorded_p50_ms": round(percentile(recorded, 50) * 1000, 3),
+        "recorded_p95_ms": round(percentile(recorded, 95) * 1000, 3),
+    }
+
+    print_success(f"{len(latencies)} workflows em {elapsed:.2f}s ({report['throughput']} workflows/s)")
+    print(f"  p50={report['p50_ms']:.2f}ms  p95={report['p95_ms']:.2f}ms  p99={report['p99_ms']:.2f}ms")
+    print(f"  gravado: p50={report['recorded_p50_ms']:.2f}ms  p95={report['recorded_p95_ms']:.2f}ms")
+    if changed:
+        print_error(f"{changed} post(s) final(is) diferentes do gravado (mudança de comportamento)")
+    for error in errors[:5]:
+        print_error(error)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print_info(f"Relatório salvo em {args.save}")
+
+    failed = bool(errors)
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print_header("COMPARAÇÃO COM A LINHA DE BASE")
+        if baseline.get("speed") != args.speed or baseline.get("concurrency") != args.concurrency:
+            print_info(f"Linha de base com speed={baseline.get('speed')} e concorrência "
+                       f"{baseline.get('concurrency')}: use os mesmos valores para comparar")
+        for metric in ("p50_ms", "p95_ms"):
+            before, after = baseline[metric], report[metric]
+            delta = (after - before) / before * 100 if before else 0.0
+            line = f"{metric}: {before:.2f} -> {after:.2f}ms ({delta:+.1f}%)"
+            if delta > args.threshold:
+                print_error(f"{line}  regressão acima de {args.threshold:.0f}%")
+                failed = True
+            else:
+                print_success(line)
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do sistema de geração de posts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    workers = subparsers.add_parser("workers", help="Throughput do Web API com 1..N workers")
+    workers.add_argument("--workers", default="1,2,4", help="Lista de contagens de workers (ex: 1,2,4)")
+    workers.add_argument("--duration", type=float, default=10.0, help="Segundos por rodada")
+    workers.add_argument("--concurrency", type=int, default=64, help="Conexões simultâneas")
+    workers.add_argument("--load-procs", type=int, default=2, help="Processos geradores de carga")
+    workers.add_argument("--posts", type=int, default=200, help="Posts sintéticos no histórico")
+    workers.add_argument("--port", type=int, default=18000)
+    workers.set_defaults(func=run_workers_benchmark)
+
+    transport = subparsers.add_parser("transport", help="Orquestrador via HTTP vs agentes em processo")
+    transport.add_argument("--workflows", type=int, default=500, help="Workflows por modo")
+    transport.add_argument("--concurrency", type=int, default=8, help="Workflows simultâneos")
+    transport.add_argument("--delay-ms", type=float, default=0.0, help="Atraso simulado do modelo por etapa")
+    transport.add_argument("--port", type=int, default=18101, help="Porta do Agent 1 stub (Agent 2 usa a seguinte)")
+    transport.add_argument("--compress-min-bytes", type=int, default=0, help="gzip a partir de N bytes (0 desliga)")
+    transport.set_defaults(func=run_transport_benchmark)
+
+    codec = subparsers.add_parser("codec", help="Payloads JSON com e sem gzip num lote (tamanho, CPU e HTTP)")
+    codec.add_argument("--workflows", type=int, default=200, help="Workflows do lote sintético")
+    codec.add_argument("--variants", type=int, default=3, help="Variantes por workflow")
+    codec.add_argument("--history", help="Diretório de histórico real para incluir na medição")
+    codec.add_argument("--repeat", type=int, default=5, help="Rodadas de tempo por formato")
+    codec.add_argument("--seed", type=int, default=42)
+    codec.add_argument("--concurrency", type=int, default=8, help="Workflows simultâneos no modo HTTP")
+    codec.add_argument("--compress-min-bytes", type=int, default=1024, help="Limite do gzip no modo HTTP")
+    codec.add_argument("--port", type=int, default=18111, help="Porta do Agent 1 stub (Agent 2 usa a seguinte)")
+    codec.set_defaults(func=run_codec_benchmark)
+
+    replay = subparsers.add_parser("replay", help="Reproduz tráfego gravado (CASSETTE_MODE=record) contra o código atual")
+    replay.add_argument("--cassettes", default="cassettes", help="CASSETTE_DIR usado na gravação pelo Web API")
+    replay.add_argument("--speed", type=float, default=0.0,
+                        help="Velocidade das respostas dos agentes: 1 = gravada, 10 = 10x mais rápido, 0 = sem espera")
+    replay.add_argument("--concurrency", type=int, default=8, help="Workflows simultâneos")
+    replay.add_argument("--limit", type=int, default=0, help="Reproduz só os N primeiros workflows")
+    replay.add_argument("--save", help="Grava o relatório JSON (linha de base)")
+    replay.add_argument("--baseline", help="Compara com um relatório salvo e falha em regressão")
+    replay.add_argument("--threshold", type=float, default=10.0, help="Regressão tolerada em p50/p95 (%%)")
+    replay.set_defaults(func=run_replay_benchmark)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
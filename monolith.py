@@ -0,0 +1,92 @@
+"""
+Modo monólito: Web API, Agent 1 e Agent 2 em um único processo
+
+Para instalações pequenas em um só host. Os apps dos agentes são carregados
+no mesmo processo e o orquestrador usa InProcessTransport, chamando as
+funções dos agentes diretamente (sem JSON, loopback HTTP nem parse da
+resposta). Os agentes continuam acessíveis por HTTP em /agent1 e /agent2.
+
+Uso:
+    OLLAMA_HOST=http://localhost:11434 GOOGLE_API_KEY=... \\
+    HISTORY_DIR=./history OUTPUTS_DIR=./outputs INDEX_PATH=api/index.html \\
+    python monolith.py
+"""
+import importlib.util
+import os
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Dict
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+# Raiz (pacote shared/) e os diretórios dos serviços
+for path in (ROOT_DIR, *(ROOT_DIR / directory for directory in ("api", "agent1-local", "agent2-gemini"))):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from transport import InProcessTransport, with_cassette  # noqa: E402
+
+
+def load_agent(module_name: str, directory: str) -> ModuleType:
+    """Importa o app.py de um agente com um nome de módulo próprio"""
+    spec = importlib.util.spec_from_file_location(module_name, ROOT_DIR / directory / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def agent1_routes(agent1: ModuleType) -> Dict:
+    return {
+        ("GET", "/"): lambda payload, headers: agent1.health(),
+        ("POST", "/api/tools/generate_draft"): lambda payload, headers: agent1.handle_generate_draft(
+            agent1.GenerateDraftRequest(**payload), headers
+        ),
+    }
+
+
+def agent2_routes(agent2: ModuleType) -> Dict:
+    return {
+        ("GET", "/"): lambda payload, headers: agent2.root(),
+        ("POST", "/improve"): lambda payload, headers: agent2.handle_improve_caption(
+            agent2.ImproveCaptionRequest(**payload), agent2._request_deadline(headers)
+        ),
+        ("POST", "/improve-variants"): lambda payload, headers: agent2.handle_improve_variants(
+            agent2.ImproveVariantsRequest(**payload), agent2._request_deadline(headers)
+        ),
+        ("POST", "/generate-image"): lambda payload, headers: agent2.handle_generate_image_description(
+            agent2.GenerateImageRequest(**payload), agent2._request_deadline(headers)
+        ),
+    }
+
+
+def build_app():
+    agent1 = load_agent("agent1_app", "agent1-local")
+    agent2 = load_agent("agent2_app", "agent2-gemini")
+    import web_app
+
+    # Mantém a gravação/reprodução (CASSETTE_MODE) que os clientes aplicam ao HTTP
+    web_app.orchestrator.agent1.transport = with_cassette(
+        "agent1", InProcessTransport("agent1", agent1_routes(agent1))
+    )
+    web_app.orchestrator.agent2.transport = with_cassette(
+        "agent2", InProcessTransport("agent2", agent2_routes(agent2))
+    )
+
+    # Sub-apps montados não executam os próprios eventos de startup/shutdown
+    for agent in (agent1, agent2):
+        web_app.app.router.on_startup.extend(agent.app.router.on_startup)
+        web_app.app.router.on_shutdown.extend(agent.app.router.on_shutdown)
+        web_app.app.mount(f"/{agent.__name__.split('_')[0]}", agent.app)
+
+    web_app.logger.info("🧱 Modo monólito: agentes em processo (sem HTTP entre serviços)")
+    return web_app.app
+
+
+app = build_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("monolith:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")),
+                workers=int(os.getenv("WORKERS", "1")))
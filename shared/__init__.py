@@ -0,0 +1,7 @@
+"""
+Módulos usados por mais de um serviço (Web API, Agent 1 e Agent 2)
+
+Fonte única: cada Dockerfile copia este diretório para /app/shared. Fora dos
+containers, a raiz do repositório precisa estar no PYTHONPATH (monolith.py e
+benchmark.py já cuidam disso).
+"""
@@ -0,0 +1,145 @@
+"""
+Gravação e reprodução (record/replay) de chamadas a serviços externos
+
+Com CASSETTE_MODE=record, cada chamada (aos agentes, ao Ollama ou ao Gemini)
+é acrescentada a CASSETTE_DIR/<nome>.ndjson com a requisição, a resposta e a
+latência observada. Com CASSETTE_MODE=replay, as respostas vêm do cassete,
+sem rede nem modelo:
+
+  * a mesma requisição recebe as respostas gravadas na ordem em que
+    ocorreram (a última se repete quando acabam);
+  * a latência gravada é reproduzida dividida por REPLAY_SPEED
+    (1 = velocidade gravada, 10 = dez vezes mais rápido, 0 = sem espera);
+  * uma requisição que não está no cassete é erro (CassetteMiss): o serviço
+    passou a enviar outra coisa, e o replay não tem como responder.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """Requisição sem resposta gravada no cassete"""
+    pass
+
+
+def request_key(*parts: Any) -> str:
+    """Chave determinística de uma requisição (sha256 do JSON canônico)"""
+    canonical = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Arquivo NDJSON de interações gravadas, uma por linha"""
+
+    def __init__(self, path: Path, mode: str, speed: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modo de cassete inválido: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.recorded = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        if mode == "replay":
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, name: str, default_dir: str = "/app/cassettes") -> Optional["Cassette"]:
+        """Cassete `name` conforme CASSETTE_MODE / CASSETTE_DIR / REPLAY_SPEED (None se desligado)"""
+        mode = os.getenv("CASSETTE_MODE", "off").lower()
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"CASSETTE_MODE inválido: {mode} (use {', '.join(CASSETTE_MODES)})")
+        if mode == "off":
+            return None
+        path = Path(os.getenv("CASSETTE_DIR", default_dir)) / f"{name}.ndjson"
+        cassette = cls(path, mode, speed=float(os.getenv("REPLAY_SPEED", "1")))
+        logger.info(f"📼 Cassete {name}: {mode} em {path}")
+        return cassette
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            raise FileNotFoundError(f"Cassete não encontrado: {self.path}")
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # última linha pela metade (gravação interrompida)
+                self._entries.setdefault(entry["key"], []).append(entry)
+
+    def entries(self) -> List[Dict]:
+        """Todas as interações carregadas (modo replay)"""
+        return [entry for entries in self._entries.values() for entry in entries]
+
+    def record(self, key: str, request: Any, response: Any, latency: float, status: int = 200) -> None:
+        line = json.dumps({
+            "key": key,
+            "request": request,
+            "response": response,
+            "status": status,
+            "latency_s": round(latency, 6),
+            "recorded_at": datetime.now().isoformat(),
+        }, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def lookup(self, key: str) -> Dict:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(f"Requisição {key[:12]} não está em {self.path.name}")
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            self.hits += 1
+            return entries[min(index, len(entries) - 1)]
+
+    async def replay(self, key: str) -> Dict:
+        """Interação gravada para `key`, depois de esperar a latência gravada / speed"""
+        entry = self.lookup(key)
+        if self.speed > 0 and entry["latency_s"] > 0:
+            await asyncio.sleep(entry["latency_s"] / self.speed)
+        return entry
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "path": str(self.path),
+            "speed": self.speed,
+            "recorded": self.recorded,
+            "hits": self.hits,
+            "misses": self.misses,
+            "keys": len(self._entries),
+        }
+
+
+_shared: Dict[str, Optional[Cassette]] = {}
+
+
+def shared_cassette(name: str, default_dir: str = "/app/cassettes") -> Optional[Cassette]:
+    """Um cassete por nome e processo (None com CASSETTE_MODE=off)"""
+    if name not in _shared:
+        _shared[name] = Cassette.from_env(name, default_dir)
+    return _shared[name]
@@ -0,0 +1,151 @@
+"""
+Compressão gzip dos payloads entre o orquestrador e os agentes
+
+Os corpos são sempre JSON. Corpos grandes podem ir comprimidos com gzip
+(`Content-Encoding`), nos dois sentidos. O agente anuncia que aceita corpos
+gzip com o cabeçalho de resposta `Accept-Encoding` (RFC 7694), e o cliente só
+comprime depois de ver esse anúncio, então clientes e agentes de versões
+diferentes continuam conversando em JSON puro.
+
+(Um modo msgpack existiu e foi removido: com texto em português ele gerava
+~98% dos bytes do JSON compacto, e como o FastAPI só entende JSON, o
+middleware transcodificava nos dois sentidos; ponta a ponta ficava mais
+lento que JSON.)
+"""
+
+import gzip
+import json
+import logging
+import os
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JSON_TYPE = "application/json"
+
+
+def media_type_of(content_type: Optional[str]) -> str:
+    """'application/json; charset=utf-8' -> 'application/json'"""
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def encode(data: Any) -> bytes:
+    """JSON compacto em UTF-8"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compress(body: bytes, min_bytes: int) -> Tuple[bytes, Optional[str]]:
+    """gzip quando o corpo tem pelo menos `min_bytes` (0 desliga)"""
+    if min_bytes > 0 and len(body) >= min_bytes:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+class CodecMiddleware:
+    """Middleware ASGI: corpo gzip na entrada, resposta JSON comprimida se o cliente aceita"""
+
+    def __init__(self, app, min_compress_bytes: int = 1024):
+        self.app = app
+        self.min_compress_bytes = min_compress_bytes
+
+    @classmethod
+    def install(cls, app) -> None:
+        """Adiciona o middleware; CODEC_COMPRESS_MIN_BYTES=0 desliga a compressão das respostas"""
+        min_bytes = int(os.getenv("CODEC_COMPRESS_MIN_BYTES", "1024"))
+        app.add_middleware(cls, min_compress_bytes=min_bytes)
+
+    @staticmethod
+    async def _error(send, status: int, detail: str) -> None:
+        body = encode({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", JSON_TYPE.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"accept-encoding", b"gzip"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        body_encoding = headers.get("content-encoding", "").strip().lower()
+        wants_gzip = self.min_compress_bytes > 0 and "gzip" in headers.get("accept-encoding", "").lower()
+
+        if body_encoding not in ("", "identity", "gzip"):
+            # RFC 7694: codificação de corpo não suportada -> 415 + Accept-Encoding
+            await self._error(send, 415, f"Content-Encoding não suportado: {body_encoding}")
+            return
+
+        if body_encoding == "gzip":
+            chunks = []
+            while True:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    break
+            try:
+                body = gzip.decompress(b"".join(chunks))
+            except Exception as e:
+                await self._error(send, 400, f"Corpo inválido: {e}")
+                return
+
+            # O FastAPI recebe o corpo já descomprimido
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value) for name, value in scope["headers"]
+                if name not in (b"content-encoding", b"content-length")
+            ] + [(b"content-length", str(len(body)).encode())]
+            delivered = False
+
+            async def receive_decoded():
+                nonlocal delivered
+                if not delivered:
+                    delivered = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                return await receive()
+        else:
+            receive_decoded = receive
+
+        start_message = None
+        chunks = []
+
+        async def send_negotiated(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                response_type = media_type_of(dict(message.get("headers", [])).get(b"content-type", b"").decode())
+                if response_type == JSON_TYPE and wants_gzip:
+                    start_message = message  # só envia depois de comprimir o corpo
+                    return
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"accept-encoding", b"gzip")]
+                await send(message)
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body, encoding = compress(b"".join(chunks), self.min_compress_bytes)
+            response_headers = [
+                (name, value) for name, value in start_message.get("headers", [])
+                if name != b"content-length"
+            ]
+            if encoding:
+                response_headers.append((b"content-encoding", encoding.encode()))
+            response_headers += [
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b"Accept-Encoding"),
+                (b"accept-encoding", b"gzip"),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive_decoded, send_negotiated)
@@ -0,0 +1,140 @@
+"""
+Profiling sob demanda de requisições HTTP
+
+Ativado por requisição com o cabeçalho `X-Profile` (quando PROFILING=1) ou por
+amostragem (PROFILE_SAMPLE_RATE). O handler inteiro é perfilado e o resultado
+é gravado em PROFILE_DIR: formato speedscope (.speedscope.json) com
+pyinstrument, ou pstats (.prof) com cProfile quando pyinstrument não está
+instalado. Sem nenhum dos dois ligados o middleware nem é instalado.
+
+O valor do cabeçalho pode ser um id (letras, dígitos, '-' e '_'); ele é
+repassado entre serviços para que os perfis de uma mesma requisição
+compartilhem o mesmo id no nome do arquivo.
+"""
+
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+try:
+    # Opcional: profiler por amostragem, ciente de async
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Id do perfil da requisição atual (None quando não está sendo perfilada)
+current_profile: ContextVar[Optional[str]] = ContextVar("current_profile", default=None)
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _profile_id(header_value: Optional[str]) -> str:
+    if header_value and header_value.lower() not in ("1", "true", "yes") and _VALID_ID.match(header_value):
+        return header_value
+    return uuid.uuid4().hex[:12]
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila as requisições marcadas ou sorteadas"""
+
+    def __init__(self, app, service: str, output_dir: Path, sample_rate: float = 0.0, allow_header: bool = True):
+        self.app = app
+        self.service = service
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self._cprofile_busy = False  # cProfile não aceita dois perfis ativos no mesmo processo
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def install(cls, app, service: str, default_dir: str) -> bool:
+        """Adiciona o middleware ao app conforme PROFILING / PROFILE_SAMPLE_RATE"""
+        allow_header = os.getenv("PROFILING", "0") == "1"
+        sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        if not allow_header and sample_rate <= 0:
+            return False
+        output_dir = Path(os.getenv("PROFILE_DIR", default_dir))
+        app.add_middleware(
+            cls, service=service, output_dir=output_dir,
+            sample_rate=sample_rate, allow_header=allow_header
+        )
+        backend = "pyinstrument" if Profiler is not None else "cProfile"
+        logger.info(f"🔬 Profiling ativo ({backend}, amostragem {sample_rate:.2%}) em {output_dir}")
+        return True
+
+    def _requested(self, scope) -> Optional[str]:
+        if self.allow_header:
+            header = PROFILE_HEADER.lower().encode("latin-1")
+            for name, value in scope.get("headers", ()):
+                if name == header:
+                    return _profile_id(value.decode("latin-1"))
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return _profile_id(None)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile_id = self._requested(scope)
+        if profile_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (PROFILE_ID_HEADER.lower().encode("latin-1"), profile_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        path_slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        base = self.output_dir / f"{time.strftime('%Y%m%d_%H%M%S')}_{profile_id}_{self.service}_{path_slug}"
+        token = current_profile.set(profile_id)
+        try:
+            if Profiler is not None:
+                profiler = Profiler(interval=0.001, async_mode="enabled")
+                profiler.start()
+                try:
+                    await self.app(scope, receive, send_with_id)
+                finally:
+                    profiler.stop()
+                    await asyncio.to_thread(self._write_speedscope, profiler, base)
+            elif not self._cprofile_busy:
+                self._cprofile_busy = True
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_with_id)
+                finally:
+                    profiler.disable()
+                    self._cprofile_busy = False
+                    await asyncio.to_thread(profiler.dump_stats, f"{base}.prof")
+                    logger.info(f"🔬 Perfil gravado: {base}.prof")
+            else:
+                logger.debug(f"Perfil {profile_id} ignorado: outro perfil cProfile em andamento")
+                await self.app(scope, receive, send)
+        finally:
+            current_profile.reset(token)
+
+    @staticmethod
+    def _write_speedscope(profiler, base: Path) -> None:
+        path = f"{base}.speedscope.json"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output(SpeedscopeRenderer()))
+        logger.info(f"🔬 Perfil gravado: {path}")
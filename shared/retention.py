@@ -0,0 +1,439 @@
+"""
+Retenção: arquivos pequenos antigos viram segmentos comprimidos
+
+Cada post (ou descrição de imagem) é um arquivo pequeno; com o tempo isso
+esgota inodes e deixa a listagem do diretório lenta. A compactação move os
+arquivos mais antigos que `archive_after_days` (e os mais antigos além de
+`max_loose_mb`) para segmentos SQLite mensais, um registro comprimido (zlib)
+por arquivo, e um índice único (`index.db`) diz em qual segmento está cada
+nome. Os arquivos arquivados continuam legíveis por `SegmentArchive.get`,
+que devolve um objeto com a mesma interface usada de um Path (`name`,
+`read_bytes()`, `stat()`).
+
+Segmentos inteiros são apagados quando todo o conteúdo passa de
+`delete_after_days` ou quando o arquivo morto passa de `max_archive_mb`
+(0 desliga cada limite). Com vários workers, um lock de arquivo garante que
+só um compacta por vez; os relatórios ficam no índice para qualquer worker.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def _allocated(st: os.stat_result) -> int:
+    """Espaço ocupado em disco (blocos), que é o que arquivos pequenos desperdiçam"""
+    return getattr(st, "st_blocks", 0) * 512 or st.st_size
+
+
+class ArchiveStat(NamedTuple):
+    st_size: int
+    st_mtime: float
+    st_mtime_ns: int
+
+
+class ArchivedFile:
+    """Arquivo dentro de um segmento (mesma interface usada de um Path)"""
+
+    def __init__(self, archive: "SegmentArchive", name: str, segment: str, size: int, mtime_ns: int):
+        self.archive = archive
+        self.name = name
+        self.segment = segment
+        self._stat = ArchiveStat(size, mtime_ns / 1e9, mtime_ns)
+
+    def stat(self) -> ArchiveStat:
+        return self._stat
+
+    def read_bytes(self) -> bytes:
+        return self.archive.read(self.name, self.segment)
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        return self.read_bytes().decode(encoding)
+
+
+class SegmentArchive:
+    """Segmentos SQLite mensais (segment_YYYYMM.db) + índice por nome"""
+
+    def __init__(self, archive_dir: Path):
+        self.archive_dir = archive_dir
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect_index() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    name TEXT PRIMARY KEY,
+                    segment TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    archived_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    finished_at TEXT NOT NULL,
+                    report TEXT NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self, path: Path) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _connect_index(self):
+        return self._connect(self.archive_dir / "index.db")
+
+    def segment_path(self, segment: str) -> Path:
+        return self.archive_dir / f"segment_{segment}.db"
+
+    def segment_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.archive_dir.glob("segment_*.db*"))
+
+    # ============= LEITURA =============
+
+    def get(self, name: str) -> Optional[ArchivedFile]:
+        with self._connect_index() as conn:
+            row = conn.execute(
+                "SELECT name, segment, size, mtime_ns FROM entries WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        return ArchivedFile(self, row["name"], row["segment"], row["size"], row["mtime_ns"])
+
+    def read(self, name: str, segment: str) -> bytes:
+        path = self.segment_path(segment)
+        if not path.exists():
+            raise FileNotFoundError(f"Segmento {segment} removido")
+        with self._connect(path) as conn:
+            row = conn.execute("SELECT data FROM blobs WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"{name} não está no segmento {segment}")
+        return zlib.decompress(row["data"])
+
+    def entries(
+        self, start: Optional[str] = None, end: Optional[str] = None,
+        newest_first: bool = False, limit: Optional[int] = None
+    ) -> List[ArchivedFile]:
+        """Arquivados com nome em [start, end), em ordem de nome"""
+        query = "SELECT name, segment, size, mtime_ns FROM entries WHERE 1 = 1"
+        params: List = []
+        if start is not None:
+            query += " AND name >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND name < ?"
+            params.append(end)
+        query += f" ORDER BY name {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect_index() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [ArchivedFile(self, r["name"], r["segment"], r["size"], r["mtime_ns"]) for r in rows]
+
+    def stats(self) -> Dict:
+        with self._connect_index() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS size, "
+                "COALESCE(SUM(stored_size), 0) AS stored, COUNT(DISTINCT segment) AS segments FROM entries"
+            ).fetchone()
+        return {
+            "files": row["files"],
+            "segments": row["segments"],
+            "original_bytes": row["size"],
+            "stored_bytes": row["stored"],
+            "disk_bytes": self.segment_bytes(),
+            "compression_ratio": round(row["stored"] / row["size"], 3) if row["size"] else None,
+        }
+
+    # ============= ESCRITA =============
+
+    def add(self, files: List[Path]) -> List[Path]:
+        """Comprime os arquivos nos segmentos do mês do mtime; retorna os arquivados
+
+        O blob é gravado antes da entrada do índice, e o arquivo original só é
+        apagado (pelo chamador) depois dos dois commits: uma queda no meio
+        deixa, no máximo, um arquivo ainda solto e um blob órfão.
+        """
+        by_segment: Dict[str, List] = {}
+        for path in files:
+            try:
+                st = path.stat()
+                data = path.read_bytes()
+            except FileNotFoundError:
+                continue
+            segment = datetime.fromtimestamp(st.st_mtime).strftime("%Y%m")
+            by_segment.setdefault(segment, []).append((path, st, zlib.compress(data, 6)))
+
+        archived = []
+        now = datetime.now().isoformat()
+        for segment, items in by_segment.items():
+            with self._connect(self.segment_path(segment)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS blobs (name TEXT PRIMARY KEY, data BLOB NOT NULL)")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO blobs (name, data) VALUES (?, ?)",
+                    [(path.name, blob) for path, _, blob in items]
+                )
+            with self._connect_index() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (name, segment, size, stored_size, mtime_ns, archived_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(path.name, segment, st.st_size, len(blob), st.st_mtime_ns, now) for path, st, blob in items]
+                )
+            archived.extend(path for path, _, _ in items)
+        return archived
+
+    def checkpoint(self) -> None:
+        """Esvazia os WAL dos segmentos para medir (e liberar) o espaço real"""
+        for path in self.archive_dir.glob("segment_*.db"):
+            with self._connect(path) as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def segments(self) -> List[Dict]:
+        """Segmentos do mais antigo ao mais novo, com o mtime mais recente de cada"""
+        with self._connect_index() as conn:
+            rows = conn.execute(
+                "SELECT segment, MAX(mtime_ns) AS newest_ns, COUNT(*) AS files "
+                "FROM entries GROUP BY segment ORDER BY segment"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def drop_segment(self, segment: str) -> int:
+        """Apaga um segmento inteiro; retorna os bytes liberados"""
+        with self._connect_index() as conn:
+            conn.execute("DELETE FROM entries WHERE segment = ?", (segment,))
+        freed = 0
+        for suffix in ("", "-wal", "-shm"):
+            path = Path(f"{self.segment_path(segment)}{suffix}")
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def record_run(self, report: Dict, keep: int = 50) -> None:
+        with self._connect_index() as conn:
+            conn.execute(
+                "INSERT INTO runs (finished_at, report) VALUES (?, ?)",
+                (datetime.now().isoformat(), json.dumps(report, ensure_ascii=False))
+            )
+            conn.execute("DELETE FROM runs WHERE id <= (SELECT MAX(id) FROM runs) - ?", (keep,))
+
+    def recent_runs(self, limit: int = 5) -> List[Dict]:
+        with self._connect_index() as conn:
+            rows = conn.execute(
+                "SELECT finished_at, report FROM runs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"finished_at": row["finished_at"], **json.loads(row["report"])} for row in rows]
+
+
+class RetentionPolicy:
+    """Limites de idade e tamanho (0 desliga o limite)"""
+
+    def __init__(
+        self,
+        archive_after_days: float = 30,
+        max_loose_mb: float = 0,
+        delete_after_days: float = 0,
+        max_archive_mb: float = 0
+    ):
+        self.archive_after_days = archive_after_days
+        self.max_loose_mb = max_loose_mb
+        self.delete_after_days = delete_after_days
+        self.max_archive_mb = max_archive_mb
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            archive_after_days=float(os.getenv("RETENTION_ARCHIVE_AFTER_DAYS", "30")),
+            max_loose_mb=float(os.getenv("RETENTION_MAX_LOOSE_MB", "0")),
+            delete_after_days=float(os.getenv("RETENTION_DELETE_AFTER_DAYS", "0")),
+            max_archive_mb=float(os.getenv("RETENTION_MAX_ARCHIVE_MB", "0"))
+        )
+
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+class RetentionManager:
+    """Compacta `source_dir/pattern` em `archive` periodicamente, em segundo plano"""
+
+    def __init__(
+        self,
+        source_dir: Path,
+        pattern: str,
+        archive: SegmentArchive,
+        policy: RetentionPolicy,
+        interval: float = 3600.0,
+        batch_size: int = 500
+    ):
+        self.source_dir = source_dir
+        self.pattern = pattern
+        self.archive = archive
+        self.policy = policy
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, source_dir: Path, pattern: str, name: str, default_archive_dir: Path) -> "RetentionManager":
+        """Arquivo morto em ARCHIVE_DIR/`name`: cada serviço tem índice, segmentos e
+        lock próprios, mesmo com a mesma raiz (ex: no modo monólito)"""
+        return cls(
+            source_dir=source_dir,
+            pattern=pattern,
+            archive=SegmentArchive(Path(os.getenv("ARCHIVE_DIR", str(default_archive_dir))) / name),
+            policy=RetentionPolicy.from_env(),
+            interval=float(os.getenv("RETENTION_INTERVAL_S", "3600"))
+        )
+
+    def _loose_files(self) -> List[tuple]:
+        """(caminho, stat) dos arquivos soltos, do mais antigo ao mais novo"""
+        files = []
+        for path in self.source_dir.glob(self.pattern):
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+        files.sort(key=lambda item: item[1].st_mtime)
+        return files
+
+    def _select(self, loose: List[tuple]) -> List[tuple]:
+        cutoff = time.time() - self.policy.archive_after_days * 86400
+        selected = [item for item in loose if item[1].st_mtime < cutoff] if self.policy.archive_after_days else []
+        if self.policy.max_loose_mb:
+            remaining = sum(st.st_size for _, st in loose) - sum(st.st_size for _, st in selected)
+            for item in loose[len(selected):]:
+                if remaining <= self.policy.max_loose_mb * MB:
+                    break
+                selected.append(item)
+                remaining -= item[1].st_size
+        return selected
+
+    def run_once(self) -> Dict:
+        """Uma passada completa (bloqueante: rode em thread); retorna o relatório"""
+        lock_path = self.archive.archive_dir / ".retention.lock"
+        with open(lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {"skipped": "outra compactação em andamento"}
+            try:
+                return self._run_locked()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _run_locked(self) -> Dict:
+        started = time.perf_counter()
+        archive_before = self.archive.segment_bytes()
+        selected = self._select(self._loose_files())
+
+        archived, freed_loose, original_bytes = 0, 0, 0
+        for i in range(0, len(selected), self.batch_size):
+            batch = dict(selected[i:i + self.batch_size])
+            for path in self.archive.add(list(batch)):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                archived += 1
+                original_bytes += batch[path].st_size
+                freed_loose += _allocated(batch[path])
+        if archived:
+            self.archive.checkpoint()
+        archive_added = self.archive.segment_bytes() - archive_before
+
+        dropped, freed_segments = [], 0
+        segments = self.archive.segments()
+        if self.policy.delete_after_days:
+            cutoff_ns = (time.time() - self.policy.delete_after_days * 86400) * 1e9
+            for segment in segments:
+                if segment["newest_ns"] < cutoff_ns:
+                    freed_segments += self.archive.drop_segment(segment["segment"])
+                    dropped.append(segment["segment"])
+        if self.policy.max_archive_mb:
+            for segment in segments:
+                if self.archive.segment_bytes() <= self.policy.max_archive_mb * MB:
+                    break
+                if segment["segment"] not in dropped:
+                    freed_segments += self.archive.drop_segment(segment["segment"])
+                    dropped.append(segment["segment"])
+
+        report = {
+            "archived_files": archived,
+            "archived_original_bytes": original_bytes,
+            "loose_bytes_freed": freed_loose,
+            "archive_bytes_added": archive_added,
+            "dropped_segments": dropped,
+            "segment_bytes_freed": freed_segments,
+            "reclaimed_bytes": freed_loose - archive_added + freed_segments,
+            "duration_s": round(time.perf_counter() - started, 3),
+        }
+        if archived or dropped:
+            self.archive.record_run(report)
+            logger.info(
+                f"🗜️ Retenção: {archived} arquivo(s) compactado(s), {len(dropped)} segmento(s) apagado(s), "
+                f"{report['reclaimed_bytes'] / MB:.1f} MB recuperados em {report['duration_s']}s"
+            )
+        return report
+
+    def status(self) -> Dict:
+        loose = self._loose_files()
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_s": self.interval,
+            "policy": self.policy.as_dict(),
+            "loose": {
+                "files": len(loose),
+                "bytes": sum(st.st_size for _, st in loose),
+                "disk_bytes": sum(_allocated(st) for _, st in loose),
+            },
+            "archive": self.archive.stats(),
+            "recent_runs": self.archive.recent_runs(),
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Erro na retenção: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"🗜️ Retenção ativa para {self.source_dir} (a cada {self.interval:.0f}s)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
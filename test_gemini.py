@@ -140,8 +140,8 @@ def test_generate_image():
             print_success(f"Status: {response.status_code}")
             print_info(f"Agente: {data.get('agent')}")
             print_info(f"Modelo: {data.get('model')}")
-            print_success(f"Imagem salva em: {data.get('image_path')}")
-            print_info(f"Prompt usado: {data.get('prompt_used')[:80]}...")
+            print_success(f"Descrição salva com hash: {data.get('prompt_hash')}")
+            print_info(f"Descrição: {data.get('image_prompt', '')[:80]}...")
             return True
         else:
             print_error(f"Status: {response.status_code}")